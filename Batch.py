@@ -0,0 +1,456 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Batch generation of FRU images: one template plus a manifest of per-unit
+# field overrides gives one image per manifest row.
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from debug import *
+from BitField import *
+from collections import namedtuple
+import EERPOM
+import Planner
+import concurrent.futures
+import multiprocessing
+import csv
+import json
+import os
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+MANIFEST_FILE_KEY = "file"
+MANIFEST_KEY_SEPARATOR = "."
+
+DEFAULT_FILE_FORMAT = "%06i.bin"
+
+# Rows per task are chosen so that every worker gets several tasks
+TASKS_PER_JOB = 4
+
+# Patchable field of the template image: offsets are relative to the area,
+# type_offset is the offset of the type/length byte of a data field
+PATCH = namedtuple("Patch", "area field offset size type_offset")
+
+# Area of the template image, length_offset is relative to the area,
+# None for areas without length
+TEMPLATE_AREA = namedtuple("TemplateArea", "number offset size unused length_offset")
+
+#==============================================================================
+# Manifest
+#==============================================================================
+def readManifest(manifestFile):
+    """
+    Return list of rows, every row is a dict
+    { "file" : output file, "Area Name.field_name" : value, ... }
+
+    CSV manifest - header line with keys, one row per unit.
+    JSONL manifest - one json object per line, area may be given either as
+    "Area Name.field_name" key or as nested object { "Area Name" : {...} }
+    """
+
+    rows = []
+    if manifestFile.endswith(".csv"):
+        with open(manifestFile, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                # empty cell keeps template value
+                rows.append({ key : value for key, value in row.items() if value != "" })
+    else:
+        with open(manifestFile, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line == "":
+                    continue
+
+                rows.append(flattenRow(json.loads(line)))
+
+    return rows
+
+def flattenRow(row):
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            for field_name, field_value in value.items():
+                flat[key + MANIFEST_KEY_SEPARATOR + field_name] = field_value
+        else:
+            flat[key] = value
+
+    return flat
+
+#==============================================================================
+# Generation
+#==============================================================================
+def loadTemplate(type, templateFile):
+    if type == 'bin':
+        return EERPOM.initFromBin(templateFile)
+
+    elif type == 'ini':
+        return EERPOM.initFromIni(templateFile)
+
+    raise ValueError("Incorrect type of file")
+
+def splitKey(key):
+    # cells of a CSV row past its header have None key, see csv.DictReader
+    if isinstance(key, str) == False:
+        raise ValueError("Row has more cells than the header")
+
+    area_name, _, field_name = key.rpartition(MANIFEST_KEY_SEPARATOR)
+    return area_name, field_name
+
+def getArea(eerpom, name):
+    for component in eerpom.componentsList:
+        if component.name == name:
+            return component
+
+    return None
+
+def applyOverrides(eerpom, row):
+    for key, value in row.items():
+        if key == MANIFEST_FILE_KEY or value == None:
+            continue
+
+        area_name, field_name = splitKey(key)
+
+        area = getArea(eerpom, area_name)
+        if area == None:
+            raise ValueError("Unknown area '%s'" % area_name)
+
+        field = area.getComponent(field_name)
+        if field == None:
+            raise ValueError("Unknown field '%s' in '%s'" % (field_name, area_name))
+
+        if area.isPresent == False:
+            area.isPresent = True
+            for component in area.componentsList:
+                component.isPresent = True
+
+        try:
+            field.applyInput(str.encode(str(value)))
+
+        except ValueError as e:
+            # the row is not written with the template value
+            raise ValueError("%s: %s" % (key, e))
+
+class BatchGenerator:
+    """
+    Template tree is built once, every unit reuses it: the state of the
+    template is saved after loading and restored before the next unit, so
+    only overridden fields are set per image.
+    """
+
+    eerpom = None
+    state = None
+
+    # EEPROM size every image is fitted to, see Planner.fitImage
+    capacity = None
+
+    def __init__(self, eerpom, capacity=None):
+        self.eerpom = eerpom
+        self.capacity = capacity
+        self.eerpom.reloadNode()
+        self.state = eerpom.getState()
+
+    def generate(self, row):
+        self.eerpom.setState(self.state)
+
+        applyOverrides(self.eerpom, row)
+
+        if self.capacity != None:
+            Planner.fitImage(self.eerpom, self.capacity)
+
+        # only the areas changed by the row are reloaded
+        return self.eerpom.getData()
+
+#==============================================================================
+# Template and patch
+#==============================================================================
+class PatchGenerator:
+    """
+    Image of the template is serialized once, the image of a unit is the
+    template with the bytes of the overridden fields replaced. Checksums of
+    the changed areas and of Common Header are corrected by the sums of the
+    replaced bytes. When a data field changes the size of its area, the area
+    is relaid and the areas after it are moved.
+
+    Images are the same as BatchGenerator gives. Rows which can't be
+    patched (fields which are not patchable, areas which are not present,
+    wrong input) are generated by BatchGenerator on a copy of the template.
+    """
+
+    eerpom = None
+    data = None
+
+    # TEMPLATE_AREA of every present area in image order
+    areas = None
+
+    # manifest key -> PATCH, None for fields which are not patchable
+    patches = None
+
+    fallback = None
+
+    def __init__(self, eerpom):
+        self.eerpom = eerpom
+        self.fallback = BatchGenerator(EERPOM.TreeTemplate(eerpom).clone())
+
+        self.eerpom.reloadNode()
+        self.data = self.eerpom.getData()
+        self.patches = {}
+
+        self.areas = []
+        for area in self.eerpom.componentsList:
+            if area.isPresent == False:
+                continue
+
+            offset = area.getOffset()
+            unused = 0
+            length_offset = None
+
+            if getattr(area, "unused_field", None) != None:
+                unused = area.getUnusedSpaceSize()
+                length_offset = area.size.getOffset() - offset
+
+            self.areas.append(TEMPLATE_AREA(area.number, offset, area.getSize(), unused, length_offset))
+
+    def getPatch(self, key):
+        try:
+            return self.patches[key]
+
+        except KeyError:
+            pass
+
+        area_name, field_name = splitKey(key)
+
+        area = getArea(self.eerpom, area_name)
+        if area == None:
+            raise ValueError("Unknown area '%s'" % area_name)
+
+        field = area.getComponent(field_name)
+        if field == None:
+            raise ValueError("Unknown field '%s' in '%s'" % (field_name, area_name))
+
+        patch = None
+        if field.patchable & area.isPresent:
+            offset = area.getOffset()
+            type_offset = None
+
+            if isinstance(field, EERPOM.DataField):
+                type_offset = field.size.getOffset() - offset
+
+            patch = PATCH(area, field, field.getOffset() - offset, len(field.getData()), type_offset)
+
+        self.patches[key] = patch
+        return patch
+
+    def generate(self, row):
+        # area number -> { field offset : (patch, type/length byte, data) }
+        changes = {}
+
+        for key, value in row.items():
+            if key == MANIFEST_FILE_KEY or value == None:
+                continue
+
+            patch = self.getPatch(key)
+            if patch == None:
+                return self.fallback.generate(row)
+
+            try:
+                data = str.encode(str(value))
+                type_length = None
+
+                if patch.type_offset != None:
+                    type_code, data = patch.field.encodeText(data.decode('utf-8'))
+                    type_length = setBits(setBits(0, MASK_TYPE, type_code), MASK_LENGTH, len(data))
+                else:
+                    data = patch.field.encodeInput(data)
+
+            except ValueError:
+                # the tree gives the error of the row with the field name
+                return self.fallback.generate(row)
+
+            changes.setdefault(patch.area.number, {})[patch.offset] = (patch, type_length, data)
+
+        if len(changes) == 0:
+            return self.data
+
+        areas = []
+        resized = False
+        for area in self.areas:
+            if area.number in changes:
+                area_data = self.patchArea(area, changes[area.number])
+                if area_data == None:
+                    return self.fallback.generate(row)
+
+                resized |= len(area_data) != area.size
+                areas.append((area, area_data))
+
+        if resized == False:
+            image = bytearray(self.data)
+            for area, area_data in areas:
+                image[area.offset:area.offset + area.size] = area_data
+
+            return bytes(image)
+
+        return self.relayout({ area.number : area_data for area, area_data in areas })
+
+    def patchArea(self, area, area_changes):
+        """
+        Return the patched bytes of the area, None when the area
+        can't be relaid
+        """
+
+        old = memoryview(self.data)[area.offset:area.offset + area.size]
+        pieces = []
+        position = 0
+        delta = 0
+        resize = False
+
+        for offset in sorted(area_changes):
+            patch, type_length, data = area_changes[offset]
+
+            if type_length != None:
+                # data field sets the size of its area, see DataField.setData
+                pieces.append(old[position:patch.type_offset])
+                pieces.append(bytes([type_length]))
+                delta += type_length - old[patch.type_offset]
+                resize = True
+            else:
+                pieces.append(old[position:offset])
+
+            pieces.append(data)
+            delta += sum(data) - sum(old[offset:offset + patch.size])
+            position = offset + patch.size
+
+        # used bytes up to the unused space
+        pieces.append(old[position:area.size - 1 - area.unused])
+        used = bytearray(b''.join(pieces))
+
+        size = area.size
+        if resize:
+            # used bytes, checksum and one byte of unused space
+            size = EERPOM.alignSize(len(used) + 2, EERPOM.MUL_LENGTH)
+            if (size > EERPOM.MAX_AREA_SIZE) | (area.length_offset == None):
+                return None
+
+            length = size // EERPOM.MUL_LENGTH
+            delta += length - used[area.length_offset]
+            used[area.length_offset] = length
+
+        checksum = (old[area.size - 1] - delta) & 0xff
+        return bytes(used) + bytes(size - len(used) - 1) + bytes([checksum])
+
+    def relayout(self, changed):
+        header = bytearray(self.data[:EERPOM.SUGGESTED_SIZE_COMMON_HEADER])
+        image = [header]
+        offset = 0
+
+        for area in self.areas:
+            if area.number == EERPOM.N_COMMON_HEADER:
+                area_data = header
+            elif area.number in changed:
+                area_data = changed[area.number]
+            else:
+                area_data = self.data[area.offset:area.offset + area.size]
+
+            if area.number != EERPOM.N_COMMON_HEADER:
+                header[area.number] = offset // EERPOM.MUL_OFFSET
+                image.append(area_data)
+
+            offset += EERPOM.alignSize(len(area_data), EERPOM.MUL_OFFSET)
+
+        last = EERPOM.SUGGESTED_SIZE_COMMON_HEADER - 1
+        delta = sum(header[:last]) - sum(self.data[:last])
+        header[last] = (header[last] - delta) & 0xff
+
+        return b''.join(image)
+
+def getOutputPath(row, index, outputDir):
+    path = row.get(MANIFEST_FILE_KEY) or DEFAULT_FILE_FORMAT % index
+    return os.path.join(outputDir, path)
+
+def writeImage(generator, row, index, outputDir):
+    path = getOutputPath(row, index, outputDir)
+    try:
+        data = generator.generate(row)
+        with open(path, "wb+") as f:
+            f.write(data)
+
+        return (path, None)
+
+    except (ValueError, OSError) as e:
+        return (path, str(e))
+
+def getGenerator(eerpom, capacity=None, patch=False):
+    # images fitted to EEPROM size are planned on the tree
+    if patch & (capacity == None):
+        return PatchGenerator(eerpom)
+
+    return BatchGenerator(eerpom, capacity)
+
+def generateImages(eerpom, rows, outputDir=".", capacity=None, patch=False):
+    """
+    Write one image per manifest row, return list of (path, error) pairs,
+    error is None for successfully written images.
+
+    patch - images are patched template images, see PatchGenerator
+    """
+
+    generator = getGenerator(eerpom, capacity, patch)
+    results = []
+
+    for index, row in enumerate(rows):
+        results.append(writeImage(generator, row, index, outputDir))
+
+    return results
+
+#==============================================================================
+# Parallel generation
+#==============================================================================
+
+# Template generator of the worker process, see initWorker
+workerGenerator = None
+workerOutputDir = None
+
+def initWorker(type, templateFile, outputDir, capacity, patch):
+    global workerGenerator, workerOutputDir
+
+    workerGenerator = getGenerator(loadTemplate(type, templateFile), capacity, patch)
+    workerOutputDir = outputDir
+
+def runWorker(item):
+    index, row = item
+    return writeImage(workerGenerator, row, index, workerOutputDir)
+
+def getMultiprocessingContext():
+    # fork does not re-import the main script in workers
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+
+    return multiprocessing.get_context()
+
+def generateImagesParallel(type, templateFile, rows, outputDir=".", jobs=0, capacity=None, patch=False):
+    """
+    Same as generateImages, but rows are sharded across a pool of 'jobs'
+    processes (all cores when jobs is 0). Every worker loads the template
+    once. Results keep manifest order whatever the scheduling was.
+    """
+
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs == 1:
+        return generateImages(loadTemplate(type, templateFile), rows, outputDir, capacity, patch)
+
+    chunksize = max(1, len(rows) // (jobs * TASKS_PER_JOB))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+                                                mp_context=getMultiprocessingContext(),
+                                                initializer=initWorker,
+                                                initargs=(type, templateFile, outputDir, capacity, patch)) as executor:
+
+        return list(executor.map(runWorker, enumerate(rows), chunksize=chunksize))
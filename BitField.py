@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Bit fields of FRU bytes (type/length, format version ...) on plain integers
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+BYTORDER = "big"
+
+BIT_RANGE = namedtuple("BitRange", "begin end")
+RANGE_TYPE = BIT_RANGE(7, 6)
+RANGE_LENGTH = BIT_RANGE(5, 0)
+RANGE_FORMAT_VERSION = BIT_RANGE(3, 0)
+RANGE_END_OF_LIST = BIT_RANGE(7, 7)
+
+BIT_MASK = namedtuple("BitMask", "mask shift")
+
+def getMask(start, end):
+    #  <-start     end->
+    #   7 6 5 4 3 2 1 0
+    #  +---------------+
+    #  |0|0|1|0|1|1|1|1|
+    #  +---------------+
+
+    try:
+        return MASKS[(start, end)]
+
+    except KeyError:
+        mask = BIT_MASK((1 << (start - end + 1)) - 1, end)
+        MASKS[(start, end)] = mask
+        return mask
+
+MASKS = {}
+
+MASK_TYPE = getMask(RANGE_TYPE.begin, RANGE_TYPE.end)
+MASK_LENGTH = getMask(RANGE_LENGTH.begin, RANGE_LENGTH.end)
+MASK_FORMAT_VERSION = getMask(RANGE_FORMAT_VERSION.begin, RANGE_FORMAT_VERSION.end)
+MASK_END_OF_LIST = getMask(RANGE_END_OF_LIST.begin, RANGE_END_OF_LIST.end)
+
+#==============================================================================
+# Bit operations
+#==============================================================================
+def getBits(value, mask):
+    return (value >> mask.shift) & mask.mask
+
+def setBits(value, mask, bits):
+    return (value & ~(mask.mask << mask.shift)) | ((bits & mask.mask) << mask.shift)
+
+def extractBits(data, start, end):
+    """
+    Return bits [start..end] of the data as integer,
+    bits are numbered from the least significant bit of the last byte
+    """
+
+    if len(data) == 1:
+        value = data[0]
+    else:
+        value = int.from_bytes(data, byteorder=BYTORDER)
+
+    return getBits(value, getMask(start, end))
+
+def replaceBits(o_data, n_data, start, end):
+    """
+    Return o_data with bits [start..end] replaced by the lowest bits of n_data
+    """
+
+    if len(o_data) == 1 and len(n_data) == 1:
+        return bytes([setBits(o_data[0], getMask(start, end), n_data[0])])
+
+    old_value = int.from_bytes(o_data, byteorder=BYTORDER)
+    new_value = int.from_bytes(n_data, byteorder=BYTORDER)
+
+    value = setBits(old_value, getMask(start, end), new_value)
+    return value.to_bytes(len(o_data), byteorder=BYTORDER)
@@ -0,0 +1,435 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Compact read-only FRU image: image bytes plus an array of field spans,
+# the field descriptors are shared by all the images. Fields are read
+# through views which decode straight from the bytes. Images are cached
+# by the hash of their bytes, see ParseCache
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple, OrderedDict
+import array
+import hashlib
+import EERPOM
+import Encoding
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+# span offset of the fields of areas which are not present
+NOT_PRESENT = 0xffff
+
+# type_number - number of the type/length field of a data field, None
+# for the other fields
+FIELD_DESCRIPTOR = namedtuple("FieldDescriptor", "area_number field_number area_name name kind type_number")
+
+DEFAULT_CACHE_SIZE = 4096
+
+CACHE_STATS = namedtuple("CacheStats", "hits misses size max_size")
+
+#==============================================================================
+# Schema
+#==============================================================================
+class ImageSchema:
+    """
+    Immutable list of field descriptors taken from the EERPOM tree,
+    field with number i has span (offset, length) at [2*i, 2*i + 1]
+    """
+
+    fields = None
+    index = None
+
+    # area number -> (area name, numbers of its fields)
+    areas = None
+
+    def __init__(self, eerpom):
+        fields = []
+        numbers = {}
+        self.areas = []
+
+        for area in eerpom.componentsList:
+            area_fields = []
+            for component in area.componentsList:
+                if isinstance(component, EERPOM.Table):
+                    continue
+
+                type_number = None
+                if isinstance(component, EERPOM.DataField):
+                    type_number = numbers[component.size]
+
+                numbers[component] = len(fields)
+                area_fields.append(len(fields))
+                fields.append(FIELD_DESCRIPTOR(area.number, component.number,
+                                               area.name, component.getConfigName(),
+                                               type(component), type_number))
+
+            self.areas.append((area.name, tuple(area_fields)))
+
+        self.fields = tuple(fields)
+        self.areas = tuple(self.areas)
+        self.index = {}
+        for number, field in enumerate(self.fields):
+            self.index[(field.area_name, field.name)] = number
+
+    def getSpans(self, data):
+        """
+        Spans are taken from the area codecs, the tree is not built
+        """
+
+        spans = array.array('H', [NOT_PRESENT, 0]) * len(self.fields)
+        areas = EERPOM.decodeImage(data)
+
+        for number, field in enumerate(self.fields):
+            area = areas[field.area_number]
+            if area == None:
+                continue
+
+            area_offset, area_spans = area
+            position, length = area_spans[field.field_number]
+
+            spans[2 * number] = area_offset + position
+            spans[2 * number + 1] = length
+
+        return spans
+
+# Schema of the trees built by EERPOM.newEERPOMTree
+imageSchema = None
+
+def getImageSchema():
+    global imageSchema
+
+    if imageSchema == None:
+        imageSchema = ImageSchema(EERPOM.newEERPOMTree())
+
+    return imageSchema
+
+#==============================================================================
+# Views
+#==============================================================================
+class FieldView:
+    """
+    Read-only field of a CompactImage. Data is a memoryview of the image
+    bytes, values are decoded by the methods of the field class, which
+    read only getData() and the type/length field 'size'.
+    """
+
+    __slots__ = ("image", "number")
+
+    def __init__(self, image, number):
+        self.image = image
+        self.number = number
+
+    def getDescriptor(self):
+        return getImageSchema().fields[self.number]
+
+    @property
+    def name(self):
+        return self.getDescriptor().name
+
+    @property
+    def isPresent(self):
+        return self.image.spans[2 * self.number] != NOT_PRESENT
+
+    @property
+    def size(self):
+        # type/length field of a data field
+        type_number = self.getDescriptor().type_number
+        if type_number == None:
+            return None
+
+        return FieldView(self.image, type_number)
+
+    def getKind(self):
+        return self.getDescriptor().kind
+
+    def getConfigName(self):
+        return self.getDescriptor().name
+
+    def getOffset(self):
+        return self.image.spans[2 * self.number]
+
+    def getSize(self):
+        return self.image.spans[2 * self.number + 1]
+
+    def getData(self):
+        offset = self.getOffset()
+        if offset == NOT_PRESENT:
+            return None
+
+        return memoryview(self.image.data)[offset:offset + self.getSize()]
+
+    def getInfo(self):
+        return self.getKind().getInfo(self)
+
+    def getText(self):
+        return EERPOM.DataField.getText(self)
+
+    def getTypeCode(self):
+        return EERPOM.TypeField.getTypeCode(self)
+
+    def getRecordOffsets(self):
+        return [offset for offset, type_length, data in EERPOM.iterInfoRecords(self.getData())]
+
+    def iterRecords(self):
+        return EERPOM.InfoField.iterRecords(self)
+
+    def getValue(self):
+        """
+        Value of the field as EERPOM.describeTree gives it, None for
+        the fields which are not described
+        """
+
+        kind = self.getKind()
+
+        if issubclass(kind, EERPOM.DataField):
+            return self.getText()
+
+        if issubclass(kind, EERPOM.InfoField):
+            return [Encoding.decode(type_code, data) for type_code, data in self.iterRecords()]
+
+        if issubclass(kind, (EERPOM.DateTimeField, EERPOM.ChassisTypeField, EERPOM.LanguageTypeField)):
+            return self.getInfo()
+
+        if issubclass(kind, EERPOM.FirmwareField):
+            return bytes(self.getData()).hex()
+
+        return None
+
+class AreaView:
+    """
+    Read-only area of a CompactImage, its components are FieldViews.
+    Records of Multi Record Area are walked in the image bytes.
+    """
+
+    __slots__ = ("image", "number")
+
+    def __init__(self, image, number):
+        self.image = image
+        self.number = number
+
+    @property
+    def name(self):
+        return getImageSchema().areas[self.number][0]
+
+    @property
+    def isPresent(self):
+        if self.number == EERPOM.N_COMMON_HEADER:
+            return True
+
+        return self.getOffset() != 0
+
+    @property
+    def componentsList(self):
+        return [FieldView(self.image, number) for number in getImageSchema().areas[self.number][1]]
+
+    def getOffset(self):
+        if self.number == EERPOM.N_COMMON_HEADER:
+            return 0
+
+        # offsets missing from a truncated header are 0
+        if self.number >= len(self.image.data):
+            return 0
+
+        return EERPOM.MUL_OFFSET * self.image.data[self.number]
+
+    def getComponent(self, config_name):
+        try:
+            return FieldView(self.image, self.image.getFieldNumber(self.name, config_name))
+
+        except KeyError:
+            return None
+
+    def iterRecords(self):
+        """
+        Yield (type ID, record data) of every record of Multi Record Area,
+        data is a memoryview of the image
+        """
+
+        if (self.number != EERPOM.N_MULTI_RECORD_AREA) | (self.isPresent == False):
+            return
+
+        view = memoryview(self.image.data)
+        for position, type_id, length in EERPOM.walkMultiRecords(view, self.getOffset()):
+            start = position + EERPOM.MULTI_RECORD_HEADER_SIZE
+            yield type_id, view[start:start + length]
+
+#==============================================================================
+# Image
+#==============================================================================
+class CompactImage:
+    """
+    Image is kept as its bytes and the spans of its fields. Fields are read
+    through FieldView and AreaView, which decode from the bytes without
+    building the tree. Description of the image and the usual EERPOM tree
+    of it are built once on request, see describe and getTree
+    """
+
+    __slots__ = ("data", "spans", "description", "tree")
+
+    def __init__(self, data, spans=None):
+        data = bytes(data)
+
+        if spans == None:
+            spans = getImageSchema().getSpans(data)
+
+        # image may be shared, see ParseCache
+        object.__setattr__(self, "data", data)
+        object.__setattr__(self, "spans", memoryview(spans).toreadonly())
+        object.__setattr__(self, "description", None)
+        object.__setattr__(self, "tree", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompactImage is read-only")
+
+    @classmethod
+    def fromTree(cls, eerpom):
+        return cls(eerpom.getData())
+
+    def getFieldNumber(self, area_name, name):
+        return getImageSchema().index[(area_name, name)]
+
+    def isPresent(self, area_name, name):
+        number = self.getFieldNumber(area_name, name)
+        return self.spans[2 * number] != NOT_PRESENT
+
+    @property
+    def componentsList(self):
+        return [AreaView(self, number) for number in range(len(getImageSchema().areas))]
+
+    def getArea(self, area_name):
+        for area in self.componentsList:
+            if area.name == area_name:
+                return area
+
+        return None
+
+    def getField(self, area_name, name):
+        return FieldView(self, self.getFieldNumber(area_name, name))
+
+    def describe(self):
+        """
+        Same as EERPOM.describeTree of the image, decoded from the views
+        once. The description is shared as the image is: it must not be
+        changed.
+        """
+
+        if self.description == None:
+            object.__setattr__(self, "description", self.decodeDescription())
+
+        return self.description
+
+    def decodeDescription(self):
+        areas = {}
+        for area in self.componentsList:
+            if (area.isPresent == False) | (area.number == EERPOM.N_COMMON_HEADER):
+                continue
+
+            fields = {}
+            for type_id, data in area.iterRecords():
+                fields.setdefault("records", []).append({ "type" : type_id, "data" : bytes(data).hex() })
+
+            for field in area.componentsList:
+                if issubclass(field.getKind(), EERPOM.DESCRIBED_FIELDS):
+                    fields[field.getConfigName()] = field.getValue()
+
+            areas[area.name] = fields
+
+        return areas
+
+    def getFieldData(self, area_name, name):
+        """
+        memoryview of the field bytes, None for fields of absent areas
+        """
+
+        number = self.getFieldNumber(area_name, name)
+        offset = self.spans[2 * number]
+
+        if offset == NOT_PRESENT:
+            return None
+
+        return memoryview(self.data)[offset:offset + self.spans[2 * number + 1]]
+
+    def getTree(self, lazy=True):
+        """
+        Tree of the image, built once and shared as the image is: it must
+        not be changed. Views are much cheaper for reading fields.
+        """
+
+        if self.tree == None:
+            object.__setattr__(self, "tree", EERPOM.initFromData(self.data, lazy))
+
+        return self.tree
+
+    def getSize(self):
+        return len(self.data)
+
+#==============================================================================
+# Cache
+#==============================================================================
+class ParseCache:
+    """
+    LRU cache of parsed images keyed by the hash of their bytes: an image
+    which was seen before costs only its hash, its spans and description
+    are decoded once. Cached images are shared, CompactImage is read-only.
+    """
+
+    maxSize = None
+    images = None
+    hits = 0
+    misses = 0
+
+    def __init__(self, maxSize=DEFAULT_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.images = OrderedDict()
+
+    def getImage(self, data):
+        key = hashlib.blake2b(data, digest_size=16).digest()
+
+        try:
+            image = self.images[key]
+            self.images.move_to_end(key)
+            self.hits += 1
+            return image
+
+        except KeyError:
+            pass
+
+        self.misses += 1
+        image = CompactImage(data)
+
+        if self.maxSize > 0:
+            self.images[key] = image
+            if len(self.images) > self.maxSize:
+                self.images.popitem(last=False)
+
+        return image
+
+    def readImage(self, binFile):
+        with open(binFile, 'rb') as fd:
+            return self.getImage(fd.read())
+
+    def getStats(self):
+        return CACHE_STATS(self.hits, self.misses, len(self.images), self.maxSize)
+
+    def clear(self):
+        self.images.clear()
+        self.hits = 0
+        self.misses = 0
+
+# Cache of the process, see getParseCache
+parseCache = None
+
+def getParseCache():
+    global parseCache
+
+    if parseCache == None:
+        parseCache = ParseCache()
+
+    return parseCache
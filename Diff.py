@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Field level difference of FRU images: raw bytes of the areas are
+# compared first, fields are decoded only in the areas which differ
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+from EERPOM import MUL_OFFSET, MUL_LENGTH, SUGGESTED_SIZE_COMMON_HEADER, \
+    N_COMMON_HEADER, N_INTERNAL_USE_AREA, N_CHASSIS_INFO_AREA, N_MULTI_RECORD_AREA, \
+    MULTI_RECORD_HEADER_SIZE, EERPOM_SCHEMA, walkMultiRecords
+import EERPOM
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+# area - name of the area, field - name of the field ("Record 1/Record Data"
+# for records of Multi Record Area), None when the whole area was added or
+# removed. old and new are descriptions of the values, None for no value
+DIFFERENCE = namedtuple("Difference", "area field old new")
+
+#==============================================================================
+# Raw areas
+#==============================================================================
+def getAreaBuffers(data):
+    """
+    Return list of memoryviews of the areas of the image in Common Header
+    order, None for areas which are not present
+    """
+
+    view = memoryview(data)
+    buffers = [view[:SUGGESTED_SIZE_COMMON_HEADER]]
+
+    for number in range(N_COMMON_HEADER + 1, len(EERPOM_SCHEMA)):
+        offset = MUL_OFFSET * view[number]
+        if (offset == 0) | (offset >= len(view)):
+            buffers.append(None)
+            continue
+
+        if number == N_INTERNAL_USE_AREA:
+            # same as InternalUseAreaTable.getSize
+            end = MUL_OFFSET * view[N_CHASSIS_INFO_AREA]
+        elif number == N_MULTI_RECORD_AREA:
+            end = offset
+            for pos, type_id, length in walkMultiRecords(view, offset):
+                end = pos + MULTI_RECORD_HEADER_SIZE + length
+        else:
+            end = offset + MUL_LENGTH * view[offset + 1]
+
+        buffers.append(view[offset:end])
+
+    return buffers
+
+#==============================================================================
+# Difference
+#==============================================================================
+class DiffImage:
+    """
+    Image with its raw areas, the tree of the image is lazy and built on the
+    first comparison which needs fields, so a golden image compared with
+    many images is decoded once
+    """
+
+    data = None
+    areas = None
+    tree = None
+
+    def __init__(self, data):
+        self.data = bytes(data)
+        self.areas = getAreaBuffers(self.data)
+
+    def getTree(self):
+        if self.tree == None:
+            self.tree = EERPOM.initFromData(self.data, lazy=True)
+
+        return self.tree
+
+    def getArea(self, number):
+        return self.getTree().componentsList[number]
+
+def describeField(field, other):
+    # description of the value, raw bytes when it says nothing new
+    info = field.getInfo()
+    if (info == None) | (info == other.getInfo()):
+        return " ".join(["%02x" % byte for byte in field.getData()])
+
+    return info
+
+def diffTables(old, new, area_name, prefix=""):
+    differences = []
+
+    old_components = old.componentsList
+    new_components = new.componentsList
+
+    for number in range(max(len(old_components), len(new_components))):
+        old_component = old_components[number] if number < len(old_components) else None
+        new_component = new_components[number] if number < len(new_components) else None
+
+        if (old_component == None) | (new_component == None):
+            # records of Multi Record Area
+            name = prefix + "Record %i" % number
+            differences.append(DIFFERENCE(area_name, name,
+                                          None if old_component == None else "present",
+                                          None if new_component == None else "present"))
+            continue
+
+        if isinstance(old_component, EERPOM.Table):
+            name = prefix + "Record %i/" % number
+            differences += diffTables(old_component, new_component, area_name, name)
+            continue
+
+        if bytes(old_component.getData()) != bytes(new_component.getData()):
+            differences.append(DIFFERENCE(area_name, prefix + old_component.name,
+                                          describeField(old_component, new_component),
+                                          describeField(new_component, old_component)))
+
+    return differences
+
+def diffImages(old, new):
+    """
+    Return list of DIFFERENCE between two DiffImage, empty list for equal images
+    """
+
+    differences = []
+
+    for number, (old_area, new_area) in enumerate(zip(old.areas, new.areas)):
+        if (old_area == None) & (new_area == None):
+            continue
+
+        area_name = EERPOM_SCHEMA[number][0]
+
+        if (old_area == None) | (new_area == None):
+            differences.append(DIFFERENCE(area_name, None,
+                                          None if old_area == None else "present",
+                                          None if new_area == None else "present"))
+            continue
+
+        if old_area == new_area:
+            continue
+
+        differences += diffTables(old.getArea(number), new.getArea(number), area_name)
+
+    return differences
+
+def diffFiles(goldenFile, binFiles):
+    """
+    Return list of (file, differences, error) for every file compared
+    with the golden one, only the golden file with its error when it
+    can't be read
+    """
+
+    try:
+        with open(goldenFile, 'rb') as fd:
+            golden = DiffImage(fd.read())
+
+        # errors of the golden areas belong to the golden file,
+        # not to the files compared with it
+        for area in golden.getTree().componentsList:
+            area.load()
+
+    except (OSError, IndexError, ValueError) as e:
+        return [(goldenFile, None, str(e))]
+
+    results = []
+    for binFile in binFiles:
+        try:
+            with open(binFile, 'rb') as fd:
+                image = DiffImage(fd.read())
+
+            results.append((binFile, diffImages(golden, image), None))
+
+        except (OSError, IndexError, ValueError) as e:
+            results.append((binFile, None, str(e)))
+
+    return results
+
+def formatDifference(difference):
+    name = difference.area
+    if difference.field != None:
+        name += ": " + difference.field
+
+    old = "-" if difference.old == None else difference.old
+    new = "-" if difference.new == None else difference.new
+
+    return "%s: %s -> %s" % (name, old, new)
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Reader of EEPROM dumps holding many concatenated FRU images
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from EERPOM import MUL_OFFSET, MUL_LENGTH, SUGGESTED_SIZE_COMMON_HEADER, \
+    N_INTERNAL_USE_AREA, N_CHASSIS_INFO_AREA, N_BOARD_INFO_AREA, N_PRODUCT_INFO_AREA, \
+    N_MULTI_RECORD_AREA, MULTI_RECORD_HEADER_SIZE, walkMultiRecords
+import EERPOM
+import mmap
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+FORMAT_VERSION = 0x01
+FORMAT_VERSION_MASK = 0x0f
+
+#==============================================================================
+# Image detection
+#==============================================================================
+def isCommonHeader(view, pos):
+    header = view[pos:pos + SUGGESTED_SIZE_COMMON_HEADER]
+
+    if len(header) != SUGGESTED_SIZE_COMMON_HEADER:
+        return False
+
+    if (header[0] & FORMAT_VERSION_MASK) != FORMAT_VERSION:
+        return False
+
+    return (sum(header) & 0xff) == 0
+
+def getMultiRecordAreaSize(view, offset):
+    end = offset
+    for pos, type_id, length in walkMultiRecords(view, offset):
+        end = pos + MULTI_RECORD_HEADER_SIZE + length
+
+    return end - offset
+
+def getImageSize(view, pos):
+    """
+    Size of the image which Common Header is at pos: end of its last area.
+    Multi Record Area may end anywhere, so the size is not rounded, padding
+    up to the next image is skipped by the search of its Common Header.
+    Internal Use Area has no length, when it is the last area it lasts up
+    to the next Common Header.
+    """
+
+    end = SUGGESTED_SIZE_COMMON_HEADER
+    iua_offset = MUL_OFFSET * view[pos + N_INTERNAL_USE_AREA]
+
+    for number in (N_CHASSIS_INFO_AREA, N_BOARD_INFO_AREA, N_PRODUCT_INFO_AREA):
+        offset = MUL_OFFSET * view[pos + number]
+        if (offset == 0) | (pos + offset + 1 >= len(view)):
+            continue
+
+        end = max(end, offset + MUL_LENGTH * view[pos + offset + 1])
+
+    mria_offset = MUL_OFFSET * view[pos + N_MULTI_RECORD_AREA]
+    if mria_offset != 0:
+        end = max(end, mria_offset + getMultiRecordAreaSize(view, pos + mria_offset))
+
+    if iua_offset >= end:
+        end = iua_offset + MUL_OFFSET
+        while (pos + end < len(view)) & (isCommonHeader(view, pos + end) == False):
+            end += MUL_OFFSET
+
+    return min(end, len(view) - pos)
+
+#==============================================================================
+# Reading
+#==============================================================================
+def iterImages(dumpFile, stride=0, lazy=False):
+    """
+    Yield (offset, EERPOM tree) for every image of the dump file.
+
+    stride - size of an image slot, 0 to find images by Common Header.
+    Slots without a valid Common Header are skipped.
+    lazy - areas of the trees are parsed on first access
+
+    The file is memory mapped and the trees keep memoryview slices of the
+    mapping, so the dump is never read into memory as a whole and a tree
+    costs nothing once it is dropped.
+    """
+
+    with open(dumpFile, 'rb') as fd:
+        try:
+            mapping = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+        except ValueError:
+            # empty file can't be mapped
+            return
+
+    view = memoryview(mapping)
+    pos = 0
+
+    while pos + SUGGESTED_SIZE_COMMON_HEADER <= len(view):
+        if stride != 0:
+            size = stride
+        elif isCommonHeader(view, pos):
+            size = getImageSize(view, pos)
+        else:
+            # images after Multi Record Area are not aligned
+            pos += 1
+            continue
+
+        if isCommonHeader(view, pos):
+            yield pos, EERPOM.initFromData(view[pos:pos + size], lazy)
+
+        pos += size
+
+    # mapping stays open while yielded trees still refer to it
+    view.release()
+    try:
+        mapping.close()
+
+    except BufferError:
+        pass
@@ -9,13 +9,18 @@ __author__ = 'andrey samokhvalov'
 # -*- coding: utf-8 -*-
 
 from debug import *
-from bitarray import *
-from collections import namedtuple
+from BitField import *
 import datetime
+import itertools
 import configparser
+import struct
 
 from LanguageCodes import *
 from ChassisTypes import *
+from MultiRecordTypes import *
+from Encoding import TYPE_CODE_BINARY, TYPE_CODE_BCD_PLUS, TYPE_CODE_6BIT_ASCII, \
+    TYPE_CODE_8BIT_ASCII, ENCODING_AUTO
+import Encoding
 #==============================================================================
 # Constants
 #==============================================================================
@@ -23,10 +28,7 @@ from ChassisTypes import *
 MUL_OFFSET = 8
 MUL_LENGTH = 8
 
-BIT_RANGE = namedtuple("BitRange", "begin end")
-RANGE_TYPE = BIT_RANGE(7, 6)
-RANGE_LENGTH = BIT_RANGE(5, 0)
-RANGE_FORMAT_VERSION = BIT_RANGE(3, 0)
+MAX_AREA_SIZE = 0xff * MUL_LENGTH
 
 # According to the IPMI FRU Standard version FOO
 BEGIN_DATE = datetime.datetime(1996, 1, 1)
@@ -39,11 +41,17 @@ SUGGESTED_SIZE_PRODUCT_INFO_AREA = 80
 
 INFO_FIELD_END_BYTE = 0xc1
 
+# the most of data bytes a type/length byte can keep
+TYPE_LENGTH_MAX_SIZE = 0x3f
+
 LEN_NUMBER = 5
 LEN_NAME = 30
 LEN_INFO = 36
 LEN_WIDTH = 8
 
+# rows of hex dump per page, see Field.iterDescription
+DUMP_PAGE_LINES = 32
+
 BYTORDER = "big"
 
 N_COMMON_HEADER = 0
@@ -51,6 +59,30 @@ N_INTERNAL_USE_AREA = 1
 N_CHASSIS_INFO_AREA = 2
 N_BOARD_INFO_AREA = 3
 N_PRODUCT_INFO_AREA = 4
+N_MULTI_RECORD_AREA = 5
+
+# Multi Record Area is a chain of records, every record is a 5 bytes
+# header (type ID, end of list/version, length, record and header
+# checksums) followed by up to 255 bytes of record data
+MULTI_RECORD_HEADER_SIZE = 5
+MULTI_RECORD_FORMAT_VERSION = 0x02
+MULTI_RECORD_MAX_DATA_SIZE = 0xff
+MULTI_RECORD_OEM_TYPE = 0xc0
+
+N_RECORD_TYPE = 0
+N_RECORD_FORMAT = 1
+N_RECORD_LENGTH = 2
+N_RECORD_CHECKSUM = 3
+N_RECORD_HEADER_CHECKSUM = 4
+N_RECORD_DATA = 5
+
+# How the size of a field is found by AreaCodec
+KIND_FIXED = 0          # size is given by the schema
+KIND_TYPE_LENGTH = 1    # one byte, keeps size of the next data field
+KIND_DATA = 2           # size is in the type/length field before it
+KIND_INFO = 3           # up to INFO_FIELD_END_BYTE
+KIND_UNUSED = 4         # up to the checksum at the end of the area
+KIND_TAIL = 5           # up to the end of the area
 
 
 class Component:
@@ -61,16 +93,28 @@ class Component:
     size = None
     isPresent = True
 
+    # data depending on the node (unused space, checksums, offsets)
+    # has to be reloaded, see Table.refresh
+    dirty = False
+
+    # attributes which may refer to other nodes of the tree, see TreeTemplate
+    references = ("root", "offset", "size")
+
+    # attributes which keep data derived from the nodes, a clone of
+    # the tree drops them, see TreeTemplate
+    caches = ()
+
     def __init__(self, name="", size=0, offset=0):
         self.offset = offset
         self.name = name
         self.size = size
         self.isPresent = False
 
+
     def initFromBin(self, data):
         pass
 
-    def initFromIni(self,config):
+    def initFromIni(self, config, strict=False):
         pass
 
     def getOffset(self):
@@ -82,6 +126,9 @@ class Component:
     def getDescription(self):
         pass
 
+    def iterDescription(self):
+        pass
+
     def setData(self, data):
         pass
 
@@ -101,6 +148,21 @@ class Field(Component):
     data = None
     leftComponent = None
 
+    # size of the field depends on its data, so offsets of the fields
+    # to the right have to be recalculated when the data is changed
+    affectsLayout = False
+
+    codecKind = KIND_FIXED
+
+    # input of the field is converted to its data by encodeInput alone,
+    # so image bytes of the field may be patched, see Batch.PatchGenerator
+    patchable = False
+
+    references = Component.references + ("leftComponent",)
+
+    # (info key, info) of the last getInfo, see getCachedInfo
+    infoCache = None
+
     def __init__(self, name="", size=0, offset=0):
         Component.__init__(self, name, size, offset)
         self.data = self.defaultData()
@@ -109,11 +171,7 @@ class Field(Component):
 
         self.isPresent = True
         offset = self.getOffset()
-        size = 0
-        if isinstance(self, InfoField):
-            size = self.getSize(data[offset:])
-        else:
-            size = self.getSize()
+        size = self.getSize()
 
         self.data = data[offset:offset + size]
 
@@ -122,29 +180,51 @@ class Field(Component):
     def defaultData(self):
         return b'\x00'
 
-    def initFromIni(self,config):
-        name = self.name.replace('/', '_')
-        name = name.replace(' ', '_')
-        config_variable_name = name.lower()
+    def initFromIni(self, config, strict=False):
+        # strict - wrong value is ValueError instead of error message
+        config_variable_name = self.getConfigName()
 
         try:
             config_string = config[config_variable_name]
             data = str.encode(config_string)
-            self.userInput(data)
+
+            if strict:
+                self.applyInput(data)
+            else:
+                self.userInput(data)
 
         except KeyError:
             return
 
 
+    def getConfigName(self):
+        name = self.name.replace('/', '_')
+        name = name.replace(' ', '_')
+        return name.lower()
+
     def getInfo(self):
         pass
 
+    def getInfoKey(self):
+        # objects the info is decoded from, data is never changed in
+        # place, so the same objects give the same info
+        return (self.getData(),)
+
+    def getCachedInfo(self):
+        key = self.getInfoKey()
+
+        if self.infoCache != None:
+            cached_key, info = self.infoCache
+            if all([new is old for new, old in zip(key, cached_key)]):
+                return info
+
+        info = self.getInfo()
+        self.infoCache = (key, info)
+        return info
+
     def getOffset(self):
-        if self.leftComponent != None:
-            if self.leftComponent != self.root:
-                return self.leftComponent.getSize() + self.leftComponent.getOffset()
-            else:
-                return self.leftComponent.getOffset()
+        if self.root != None:
+            return self.root.getOffset() + self.root.getComponentOffset(self)
 
         return 0
 
@@ -161,28 +241,73 @@ class Field(Component):
         return self.data
 
     def setData(self, data):
+        self.replaceData(data)
+        self.resetLayout()
+
+    def replaceData(self, data):
+        # checksum of the area follows the change of the bytes,
+        # see ChecksumField.reloadNode
+        if self.root != None:
+            self.root.addChecksumDelta(sum(data) - sum(self.data))
+
         self.data = data
 
+    def resetLayout(self):
+        if self.affectsLayout & (self.root != None):
+            self.root.resetLayout()
+
+    def getState(self):
+        return self.data
+
+    def setState(self, state):
+        self.data = state
+
     def userInput(self, data):
-        e_print("command 'set' unsupported for this field")
-        return
+        try:
+            self.applyInput(data)
+
+        except ValueError as e:
+            e_print(str(e))
+
+    def applyInput(self, data):
+        # same as userInput, but wrong input is ValueError, see Batch.applyOverrides
+        raise ValueError("command 'set' unsupported for this field")
+
+    def encodeInput(self, data):
+        # data of the patchable field for the input, ValueError
+        # for the input userInput does not accept
+        pass
 
     def reloadNode(self):
         pass
 
     def getDescription(self):
+        return "".join(self.iterDescription())
+
+    def iterDescription(self, page=None):
+        """
+        Yield the description by parts, hex dump row by row. With 'page'
+        only DUMP_PAGE_LINES rows of the dump from the page are given.
+        """
+
+        if self.root != None:
+            self.root.refresh()
 
         offset = LEN_INFO + LEN_NAME + LEN_NUMBER
 
-        name_format = "%-" + str(LEN_NAME) + "s"
-        info_format = "%-" + str(LEN_INFO) + "s"
-        number_format = "%-" + str(LEN_NUMBER) + "s"
+        format = "%%-%is%%-%is%%-%is" % (LEN_NUMBER, LEN_NAME, LEN_INFO)
+        yield format % (self.number, self.name, self.getCachedInfo())
 
-        format = number_format + name_format + info_format + "%s \n"
-        description = format % (self.number, self.name, self.getInfo(), dataDescription(offset, self.getData(), LEN_WIDTH))
+        lines = iterDataDescription(self.getData(), LEN_WIDTH)
+        if page != None:
+            lines = itertools.islice(lines, page * DUMP_PAGE_LINES, (page + 1) * DUMP_PAGE_LINES)
 
+        separator = "\n" + " "*offset
+        yield next(lines, "|")
+        for line in lines:
+            yield separator + line
 
-        return description
+        yield " \n"
 
 #==============================================================================
 # Field Sub Classes
@@ -191,12 +316,11 @@ class FormatVersionField(Field):
     def defaultData(self):
         return b'\x01'
 
-    def userInput(self, data):
-        e_print("You can't change version field")
-        return
+    def applyInput(self, data):
+        raise ValueError("You can't change version field")
 
     def getInfo(self):
-        format_version_number = extract_data(self.getData(), RANGE_FORMAT_VERSION.begin, RANGE_FORMAT_VERSION.end)
+        format_version_number = getBits(self.getData()[0], MASK_FORMAT_VERSION)
         description = "%i" % (format_version_number)
         return description
 
@@ -205,9 +329,8 @@ class OffsetField(Field):
     def defaultData(self):
         return b'\x00'
 
-    def userInput(self, data):
-        e_print("Offset field changes automatically")
-        return
+    def applyInput(self, data):
+        raise ValueError("Offset field changes automatically")
 
     def getInfo(self):
 
@@ -217,18 +340,58 @@ class OffsetField(Field):
 
 
 class DataField(Field):
+
+    codecKind = KIND_DATA
+
+    patchable = True
+
     def defaultData(self):
         return b''
 
-    def userInput(self, data):
-        self.setData(data)
+    def applyInput(self, data):
+        self.applyText(data.decode('utf-8'))
 
     def getInfo(self):
-        description = "%s" % (str(self.getData(),"iso-8859-1").replace("\x00", "\x20"))
+        description = "%s" % (self.getText().replace("\x00", "\x20"))
         return description
 
+    def getInfoKey(self):
+        # text depends on the type code of the type/length field
+        return (self.getData(), self.size.getData())
+
+    def getText(self):
+        return Encoding.decode(self.size.getTypeCode(), self.getData())
+
+    def applyText(self, text):
+        type_code, data = self.encodeText(text)
+
+        if self.root.getFittingSize(self.getSize(), len(data)) > MAX_AREA_SIZE:
+            raise ValueError("Area can't be larger than %i bytes" % MAX_AREA_SIZE)
+
+        self.size.setTypeCode(type_code)
+        self.setData(data)
+
+    def encodeText(self, text):
+        """
+        Return (type code, data) of the text, the encoding is chosen
+        by the type/length field, see TypeField.userInput
+        """
+
+        encoding = self.size.encoding
+
+        if encoding == ENCODING_AUTO:
+            type_code, data = Encoding.encodeAuto(text)
+        else:
+            type_code = self.size.getTypeCode() if encoding == None else Encoding.getTypeCode(encoding)
+            data = Encoding.encode(type_code, text)
+
+        if len(data) > TYPE_LENGTH_MAX_SIZE:
+            raise ValueError("Data must be less than %i bytes, encoded data is %i bytes" % (TYPE_LENGTH_MAX_SIZE + 1, len(data)))
+
+        return type_code, data
+
     def getSize(self):
-        return extract_data(self.size.getData(), RANGE_LENGTH.begin, RANGE_LENGTH.end)
+        return getBits(self.size.getData()[0], MASK_LENGTH)
 
     def setSize(self, size):
         self.size.setData(bytes([size]))
@@ -236,20 +399,20 @@ class DataField(Field):
     def setData(self, data):
         data_len = len(data)
         field_size = self.getSize()
-        max_len = self.root.getUnusedSpaceSize() + field_size
-
-        while data_len >= max_len:
-            table_size = self.root.getSize()
-            self.root.setSize(table_size + 8)
-            max_len = self.root.getUnusedSpaceSize() + field_size
+        table_size = self.root.getSize()
+        new_table_size = self.root.getFittingSize(field_size, data_len)
 
         self.setSize(data_len)
         Field.setData(self, data)
-        self.root.reloadNode()
+
+        if new_table_size != table_size:
+            self.root.setSize(new_table_size)
+
+        self.root.markDirty()
 
 class DateTimeField(Field):
-    def userInput(self, data):
-        self.setData(data)
+
+    patchable = True
 
     def getInfo(self):
 
@@ -260,36 +423,51 @@ class DateTimeField(Field):
         description = "%s" % (mfg_time.strftime(format))
         return description
 
-    def setData(self, data):
+    def applyInput(self, data):
+
+        data = self.encodeInput(data)
+
+        self.replaceData(data)
+        self.root.markDirty()
 
+    def encodeInput(self, data):
         date = data.decode("utf-8")
         format = "%H:%M %d.%m.%y"
-        mfg_date = None
 
         try:
             mfg_date = datetime.datetime.strptime(date, format)
         except ValueError:
-            e_print("format= %s" % 'H:M DD.MM.YY"')
-            return
+            raise ValueError("format= %s" % 'H:M DD.MM.YY"')
 
         delta = (mfg_date - BEGIN_DATE)
         min_delta = delta.days * 24 * 60 + delta.seconds // 60 + delta.seconds % 60
-        self.data = min_delta.to_bytes(self.getSize(), BYTORDER)
+
+        # minutes from BEGIN_DATE are unsigned and fit the field
+        max_delta = (1 << (8 * self.getSize())) - 1
+        if (min_delta < 0) | (min_delta > max_delta):
+            end_date = BEGIN_DATE + datetime.timedelta(minutes=max_delta)
+            raise ValueError("Date must be from %s to %s" % (BEGIN_DATE.strftime("%d.%m.%y"),
+                                                             end_date.strftime("%d.%m.%y")))
+
+        return min_delta.to_bytes(self.getSize(), BYTORDER)
 
 
 class LengthField(Field):
+
+    affectsLayout = True
+
     def defaultData(self):
         return b'\x02'
 
-    def userInput(self, data):
+    def applyInput(self, data):
         size = 0
         try:
             size = int(data.decode('utf-8'))
 
         except ValueError:
-            e_print("Parameter must be a number")
-            return
+            raise ValueError("Parameter must be a number")
 
+        self.checkSize(int(size / MUL_LENGTH) * MUL_LENGTH)
         self.setData(bytes([size]))
 
     def getInfo(self):
@@ -302,6 +480,18 @@ class LengthField(Field):
         size = int.from_bytes(data ,byteorder=BYTORDER)
         size = int(size / MUL_LENGTH) * MUL_LENGTH
 
+        try:
+            self.checkSize(size)
+
+        except ValueError as e:
+            e_print(str(e))
+            return
+
+        self.replaceData(bytes([int(size / MUL_LENGTH)]))
+        self.resetLayout()
+        self.root.markDirty()
+
+    def checkSize(self, size):
         table_size = self.root.getSize()
         table_unused_space_size = self.root.getUnusedSpaceSize()
 
@@ -311,15 +501,11 @@ class LengthField(Field):
         if isFirst & isSecond:
 
             min_size = table_size - (table_unused_space_size - (table_unused_space_size) % 8)
-            e_print("You can set size > %i" % min_size)
-            return
-
-        self.data = bytes([int(size / MUL_LENGTH)])
-        self.root.reloadNode()
+            raise ValueError("You can set size > %i" % min_size)
 
 class LanguageTypeField(Field):
-    def userInput(self, data):
-        self.setData(data)
+
+    patchable = True
 
     def getInfo(self):
 
@@ -333,47 +519,202 @@ class LanguageTypeField(Field):
 
         return description
 
-    def setData(self, data):
-        language_code = int(data.decode('utf-8'))
-        self.data = bytes([language_code])
-        self.root.reloadNode()
+    def applyInput(self, data):
+        self.replaceData(self.encodeInput(data))
+        self.root.markDirty()
+
+    def encodeInput(self, data):
+        try:
+            language_code = int(data.decode('utf-8'))
+
+        except ValueError:
+            raise ValueError("Parameter must be a number")
+
+        return bytes([language_code])
 
 class TypeField(Field):
 
+    affectsLayout = True
+
+    codecKind = KIND_TYPE_LENGTH
+
+    # encoding of the text of the data field: name of Encoding.ENCODINGS,
+    # ENCODING_AUTO or None to keep the type code
+    encoding = None
+
     def defaultData(self):
-        return b'\xc0'
+        return bytes([setBits(0, MASK_TYPE, TYPE_CODE_8BIT_ASCII)])
+
+    def applyInput(self, data):
+        encoding = data.decode('utf-8').lower()
+
+        if encoding not in Encoding.getEncodingNames():
+            raise ValueError("Encoding must be one of: %s" % ", ".join(Encoding.getEncodingNames()))
+
+        # text of the data field is encoded again
+        data_field = self.root.componentsList[self.number + 1]
+        text = data_field.getText()
+
+        old_encoding = self.encoding
+        self.encoding = encoding
+
+        try:
+            data_field.applyText(text)
+
+        except ValueError:
+            self.encoding = old_encoding
+            raise
+
+    def getState(self):
+        return self.data, self.encoding
+
+    def setState(self, state):
+        self.data, self.encoding = state
+
+    def getTypeCode(self):
+        return getBits(self.getData()[0], MASK_TYPE)
+
+    def setTypeCode(self, type_code):
+        self.replaceData(bytes([setBits(self.getData()[0], MASK_TYPE, type_code)]))
 
     def getInfo(self):
-        type_code = extract_data(self.getData(), RANGE_TYPE.begin, RANGE_TYPE.end)
-        str_len = extract_data(self.getData(), RANGE_LENGTH.begin, RANGE_LENGTH.end)
+        type_length = self.getData()[0]
+        type_code = getBits(type_length, MASK_TYPE)
+        str_len = getBits(type_length, MASK_LENGTH)
         description = "Type code: %i Data len: %i" % (type_code,str_len)
         return description
 
     def setData(self, data):
-        self.data = set_data(self.data,data, RANGE_LENGTH.begin,RANGE_LENGTH.end)
+        self.replaceData(bytes([setBits(self.data[0], MASK_LENGTH, data[0])]))
+        self.resetLayout()
 
 class InfoField(Field):
+
+    affectsLayout = True
+
+    codecKind = KIND_INFO
+
+    # offsets of the type/length bytes of the custom records,
+    # see getRecordOffsets
+    recordOffsets = None
+
+    caches = Field.caches + ("recordOffsets",)
+
     def defaultData(self):
         return bytes([INFO_FIELD_END_BYTE])
 
-    def getSize(self, data=None):
-        if data == None:
-            data = self.getData()
+    def initFromBin(self, data):
+        self.isPresent = True
+        offset = self.getOffset()
+        size = getInfoFieldSize(data, offset, len(data))
 
-        i=0
-        byte = data[i]
-        while(byte != INFO_FIELD_END_BYTE):
-            i += 1
-            byte = data[i]
+        self.data = data[offset:offset + size]
+        self.recordOffsets = None
 
-        self.size = i + 1
-        return self.size
+        return 0
+
+    def getSize(self):
+        return len(self.getData())
+
+    def getInfo(self):
+        description = "Custom records: %i" % len(self.getRecordOffsets())
+        return description
+
+    def getRecordOffsets(self):
+        if self.recordOffsets == None:
+            self.recordOffsets = [offset for offset, type_length, data in iterInfoRecords(self.getData())]
+
+        return self.recordOffsets
+
+    def iterRecords(self):
+        """
+        Yield (type code, data) of every custom record, data is a memoryview
+        of the field data
+        """
+
+        view = memoryview(self.getData())
+        for offset in self.getRecordOffsets():
+            size = getBits(view[offset], MASK_LENGTH)
+            yield getBits(view[offset], MASK_TYPE), view[offset + 1:offset + 1 + size]
+
+    def getRecord(self, number):
+        view = memoryview(self.getData())
+        offset = self.getRecordOffsets()[number]
+        size = getBits(view[offset], MASK_LENGTH)
+
+        return getBits(view[offset], MASK_TYPE), view[offset + 1:offset + 1 + size]
+
+    def addRecord(self, data, type_code=TYPE_CODE_8BIT_ASCII):
+        offsets = self.getRecordOffsets()
+        self.spliceRecord(len(offsets), 0, data, type_code)
+
+    def setRecord(self, number, data, type_code=TYPE_CODE_8BIT_ASCII):
+        self.spliceRecord(number, 1, data, type_code)
+
+    def removeRecord(self, number):
+        self.spliceRecord(number, 1, None)
+
+    def spliceRecord(self, number, count, data, type_code=TYPE_CODE_8BIT_ASCII):
+        """
+        Replace count records starting from record number with a record of
+        the data (None - remove them). Only the offsets of the records to
+        the right are moved, the field is not scanned again. Wrong record
+        is ValueError, the field is left as it was.
+        """
+
+        offsets = self.getRecordOffsets()
+        old_data = self.getData()
+
+        record = b''
+        if data != None:
+            if len(data) > TYPE_LENGTH_MAX_SIZE:
+                raise ValueError("Custom record must be less than %i bytes" % (TYPE_LENGTH_MAX_SIZE + 1))
+
+            type_length = setBits(setBits(0, MASK_TYPE, type_code), MASK_LENGTH, len(data))
+            if type_length == INFO_FIELD_END_BYTE:
+                raise ValueError("Type/length byte 0x%x is reserved for the end of the fields" % INFO_FIELD_END_BYTE)
+
+            record = bytes([type_length]) + bytes(data)
+
+        if (number < 0) | (count < 0) | (number + count > len(offsets)):
+            raise ValueError("No custom record %i" % (number + count - 1))
+
+        begin = offsets[number] if number < len(offsets) else len(old_data) - 1
+        end = offsets[number + count] if number + count < len(offsets) else len(old_data) - 1
+
+        delta = len(record) - (end - begin)
+        new_offsets = offsets[:number]
+        if data != None:
+            new_offsets.append(begin)
+        new_offsets += [offset + delta for offset in offsets[number + count:]]
+
+        new_data = b"".join([old_data[:begin], record, old_data[end:]])
+        self.setData(new_data)
+
+        if self.getData() is new_data:
+            self.recordOffsets = new_offsets
+
+    def setData(self, data):
+        table_size = self.root.getSize()
+        new_table_size = self.root.getFittingSize(self.getSize(), len(data))
+        if new_table_size > MAX_AREA_SIZE:
+            raise ValueError("Area can't be larger than %i bytes" % MAX_AREA_SIZE)
+
+        Field.setData(self, data)
+        self.recordOffsets = None
+
+        if new_table_size != table_size:
+            self.root.setSize(new_table_size)
+
+        self.root.markDirty()
 
 
 class UnusedField(Field):
-    def userInput(self, data):
-        e_print("Unused field always must be filled with 0x00 bytes")
-        return
+
+    codecKind = KIND_UNUSED
+
+    def applyInput(self, data):
+        raise ValueError("Unused field always must be filled with 0x00 bytes")
 
     def getSize(self):
         field_offset = self.getOffset()
@@ -391,31 +732,36 @@ class UnusedField(Field):
 
 
 class ChecksumField(Field):
-    def userInput(self, data):
-        e_print("Checksum field changes automatically")
-        return
+    def applyInput(self, data):
+        raise ValueError("Checksum field changes automatically")
 
     def getInfo(self):
         data = extract_data(self.getData())
         description = "%i" % data
         return description
 
+    def replaceData(self, data):
+        self.data = data
+
     def reloadNode(self):
-        sum = 0
-        i=0
-        area_data = self.root.getData()
-        chsm_pos = len(area_data) - 1
+        area = self.root
 
-        while i < chsm_pos:
-            sum += area_data[i]
-            i += 1
+        if area.checksumStale:
+            area_data = memoryview(area.getData())
+            checksum = getChecksum(area_data[:-1])
+        else:
+            checksum = (self.getData()[0] - area.checksumDelta) & 0xff
 
-        checksum = (sum % 256)
-        checksum = 256 - checksum
         self.setData(bytes([checksum]))
 
+        area.checksumDelta = 0
+        area.checksumStale = False
+
 
 class FirmwareField(Field):
+
+    codecKind = KIND_TAIL
+
     def getSize(self):
 
         field_offset = self.getOffset()
@@ -427,8 +773,8 @@ class FirmwareField(Field):
         return table_size - used_space
 
 class ChassisTypeField(Field):
-    def userInput(self, data):
-        self.setData(data)
+
+    patchable = True
 
     def getInfo(self):
         description = "Unknown"
@@ -442,37 +788,212 @@ class ChassisTypeField(Field):
 
         return description
 
+    def applyInput(self, data):
+        self.replaceData(self.encodeInput(data))
+        self.root.markDirty()
+
+    def encodeInput(self, data):
+        try:
+            ch_type = int(data.decode('utf-8'))
+
+        except ValueError:
+            raise ValueError("Parameter must be a number")
+
+        return bytes([ch_type])
+
+class RecordTypeField(Field):
+    def getInfo(self):
+        type_id = self.getData()[0]
+        if type_id >= MULTI_RECORD_OEM_TYPE:
+            return "OEM"
+
+        for rInfo in infoMultiRecordTypes:
+            if rInfo['Type'][0] == type_id:
+                return rInfo['Info']
+
+        return "Unknown"
+
+    def applyInput(self, data):
+        try:
+            type_id = int(data.decode('utf-8'), 0)
+
+        except ValueError:
+            raise ValueError("Parameter must be a number")
+
+        if (type_id < 0) | (type_id > 0xff):
+            raise ValueError("Record type must be less than 256")
+
+        self.replaceData(bytes([type_id]))
+        self.root.markDirty()
+
+        # records of the area are indexed by type, see MultiRecordArea.getRecords
+        if self.root.root != None:
+            self.root.root.index = None
+
+class RecordFormatField(Field):
+    def defaultData(self):
+        return bytes([MULTI_RECORD_FORMAT_VERSION])
+
+    def applyInput(self, data):
+        raise ValueError("End of list flag changes automatically")
+
+    def getInfo(self):
+        format = self.getData()[0]
+        description = "End of list: %i Version: %i" % (getBits(format, MASK_END_OF_LIST),
+                                                      getBits(format, MASK_FORMAT_VERSION))
+        return description
+
+    def isEndOfList(self):
+        return getBits(self.getData()[0], MASK_END_OF_LIST) == 1
+
+    def setEndOfList(self, isLast):
+        self.replaceData(bytes([setBits(self.getData()[0], MASK_END_OF_LIST, int(isLast))]))
+
+class RecordLengthField(Field):
+
+    affectsLayout = True
+
+    def applyInput(self, data):
+        raise ValueError("Record length changes automatically")
+
+    def getInfo(self):
+        description = "%i" % self.getData()[0]
+        return description
+
+class RecordChecksumField(ChecksumField):
+    def reloadNode(self):
+        # record checksum is of the record data, header checksum is of the
+        # header bytes before it
+        if self.number == N_RECORD_CHECKSUM:
+            data = self.root.components[N_RECORD_DATA].getData()
+        else:
+            data = b''.join([bytes(c.getData()) for c in self.root.components[:N_RECORD_HEADER_CHECKSUM]])
+
+        self.data = bytes([getChecksum(data)])
+
+class RecordDataField(Field):
+    def defaultData(self):
+        return b''
+
+    def applyInput(self, data):
+        try:
+            data = bytes.fromhex(data.decode('utf-8'))
+
+        except ValueError:
+            raise ValueError("Record data must be hex string, example: 01 a2 ff")
+
+        if len(data) > MULTI_RECORD_MAX_DATA_SIZE:
+            raise ValueError("Record data must be less than %i bytes" % (MULTI_RECORD_MAX_DATA_SIZE + 1))
+
+        self.setData(data)
+
+    def getInfo(self):
+        description = "%i bytes" % len(self.getData())
+        return description
+
+    def getSize(self):
+        return self.size.getData()[0]
+
     def setData(self, data):
-        ch_type = int(data.decode('utf-8'))
-        self.data = bytes([ch_type])
+        if len(data) > MULTI_RECORD_MAX_DATA_SIZE:
+            e_print("Record data must be less than %i bytes" % (MULTI_RECORD_MAX_DATA_SIZE + 1))
+            return
 
-        self.root.reloadNode()
+        self.replaceData(data)
+        self.size.setData(bytes([len(data)]))
+        self.root.markDirty()
 
 #==============================================================================
 # Table Class
 #==============================================================================
 class Table(Component):
 
-    componentsList = None
+    components = None
     checksum = None
 
+    # offsets of the components from the beginning of the table,
+    # see getComponentOffset
+    layout = None
+
+    # image data of the table which is not parsed yet, see load
+    pending = None
+
+    # (template, copies, group) while the components are not cloned yet,
+    # see TreeTemplate.clone
+    deferred = None
+
+    # compiled layout of the table, see AreaCodec
+    codec = None
+
+    # sum of the changes of the bytes of the table since its checksum
+    # was reloaded, the checksum is computed from all the bytes only
+    # when the changes are not known, see ChecksumField.reloadNode
+    checksumDelta = 0
+    checksumStale = True
+
+    references = Component.references + ("leftComponent", "checksum")
+
+    caches = Component.caches + ("layout",)
+
     def __init__(self, name="", size=0, offset=0, checksum=None):
 
         Component.__init__(self, name, size, offset)
-        self.componentsList = []
+        self.components = []
         self.checksum  = checksum
 
-    def initFromBin(self, data):
+    @property
+    def componentsList(self):
+        self.load()
+        return self.components
+
+    def load(self):
+        self.materialize()
+        if self.pending is None:
+            return
+
+        data = self.pending
+        self.pending = None
+
+        if self.codec != None:
+            self.loadSpans(data)
+            return
+
+        # layout is filled while parsing: offset of every component is
+        # known once the components to the left of it are parsed
+        self.layout = []
+        offset = 0
+        for component in self.components:
+            self.layout.append(offset)
+            component.initFromBin(data)
+            offset += component.getSize()
+
+    def loadSpans(self, data):
+        offset = self.getOffset()
+
+        size = None
+        if self.codec.lengthPosition == None:
+            size = self.getSize()
+
+        self.layout = []
+        for component, (position, length) in zip(self.components, self.codec.decode(data, offset, size)):
+            self.layout.append(position)
+            component.isPresent = True
+            component.data = data[offset + position:offset + position + length]
+
+    def initFromBin(self, data, lazy=False):
         offset = self.getOffset()
 
         if offset == -1:
             return
 
         self.isPresent = True
-        for component in self.componentsList:
-            component.initFromBin(data)
+        self.pending = data
+        self.checksumStale = True
+
+        if lazy == False:
+            self.load()
 
-    def initFromIni(self, config):
+    def initFromIni(self, config, strict=False):
         try:
             config = config[self.name]
             self.isPresent = True
@@ -481,9 +1002,13 @@ class Table(Component):
                 component.isPresent = True
 
             for component in self.componentsList:
-                component.initFromIni(config)
+                try:
+                    component.initFromIni(config, strict)
+
+                except ValueError as e:
+                    raise ValueError("%s.%s: %s" % (self.name, component.getConfigName(), e))
 
-            self.reloadNode()
+            self.markDirty()
 
         except KeyError:
             return
@@ -496,50 +1021,142 @@ class Table(Component):
         else:
             component.leftComponent = self
 
-        self.componentsList += [component]
+        self.components.append(component)
 
     def getUnusedSpaceSize(self):
         pass
 
-    def getData(self):
-        data = b''
+    def addChecksumDelta(self, delta):
+        self.checksumDelta += delta
+
+    def markDirty(self):
+        self.dirty = True
+        if self.root != None:
+            self.root.markDirty()
+
+    def refresh(self):
+        if self.root != None:
+            self.root.refresh()
+
+    def reloadComponents(self):
+        # checksum is reloaded after all the other data, see reloadChecksum
         for component in self.componentsList:
-            if component.isPresent:
-                data = merge_data(data, component.getData())
+            if component != self.checksum:
+                component.reloadNode()
 
-        return data
+    def reloadChecksum(self):
+        if self.checksum != None:
+            self.checksum.reloadNode()
 
-    def getDescription(self):
-        if self.isPresent == False:
+    def materialize(self):
+        if self.deferred is None:
+            return
 
-            description =  "+" + "-"*31 + "+\n"
-            description += "+ %-30s+\n" % (self.name + " NOT PRESENT")
-            description += "+" + "-"*31 + "+\n"
+        template, copies, group = self.deferred
+        self.deferred = None
+        template.cloneGroup(copies, group)
 
-            return description
+    def getComponentOffset(self, component):
+        if self.layout == None:
+            # Offset is appended before size is requested: sizes of unused
+            # space and firmware fields depend on their own offset
+            self.layout = []
+            offset = 0
+            for c in self.componentsList:
+                self.layout.append(offset)
+                offset += c.getSize()
 
-        description =  "+" + "-"*31 + "+\n"
-        description += "+ %-30s+\n" % self.name
-        description += "+" + "-"*31 + "+\n"
+        return self.layout[component.number]
 
-        str_len = LEN_WIDTH + LEN_INFO + LEN_NAME + LEN_NUMBER
+    def resetLayout(self):
+        self.layout = None
+
+    def getComponent(self, config_name):
+        for component in self.componentsList:
+            if isinstance(component, Field) and component.getConfigName() == config_name:
+                return component
 
-        number_format = "%-" + str(LEN_NUMBER) + "s"
-        name_format = "%-" + str(LEN_NAME) + "s"
-        info_format = "%-" + str(LEN_INFO) + "s"
+        return None
 
+    def setComponents(self, components):
+        self.components = []
+        for component in components:
+            self.addComponent(component)
 
-        description += "="*str_len + "\n"
-        description += (number_format + name_format + info_format + "%s \n") % ("N","NAME","INFO","DATA")
-        description += "="*str_len + "\n"
+        self.resetLayout()
+        self.checksumStale = True
 
-        i=0
+    def getState(self):
+        # list of the components is kept too, records may be added
+        # to Multi Record Area and removed from it
+        components = list(self.componentsList)
+        state = [(self, (components, self.checksumDelta, self.checksumStale), self.isPresent)]
         for component in self.componentsList:
-            description += component.getDescription()
-            description += "\n"
-            i+=1
+            if isinstance(component, Table):
+                state += component.getState()
+            else:
+                state.append((component, component.getState(), component.isPresent))
+
+        return state
+
+    def setState(self, state):
+        for component, data, isPresent in state:
+            component.isPresent = isPresent
+            if isinstance(component, Table):
+                components, checksumDelta, checksumStale = data
+                component.setComponents(components)
+                component.checksumDelta = checksumDelta
+                component.checksumStale = checksumStale
+            else:
+                component.setState(data)
 
-        return description
+    def getData(self):
+        chunks = [component.getData() for component in self.componentsList if component.isPresent]
+
+        if (self.codec != None) & (len(chunks) == len(self.components)):
+            return self.codec.encode(chunks)
+
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+
+        data = bytearray(size)
+        view = memoryview(data)
+
+        offset = 0
+        for chunk in chunks:
+            view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+
+        return bytes(data)
+
+    def getDescription(self):
+        return "".join(self.iterDescription())
+
+    def iterDescription(self):
+        """
+        Yield the description by parts, component by component
+        """
+
+        self.refresh()
+
+        border = "+" + "-"*31 + "+\n"
+
+        if self.isPresent == False:
+            yield "".join([border, "+ %-30s+\n" % (self.name + " NOT PRESENT"), border])
+            return
+
+        str_len = LEN_WIDTH + LEN_INFO + LEN_NAME + LEN_NUMBER
+        format = "%%-%is%%-%is%%-%is%%s \n" % (LEN_NUMBER, LEN_NAME, LEN_INFO)
+
+        yield "".join([border, "+ %-30s+\n" % self.name, border,
+                       "="*str_len + "\n",
+                       format % ("N","NAME","INFO","DATA"),
+                       "="*str_len + "\n"])
+
+        for component in self.componentsList:
+            yield from component.iterDescription()
+            yield "\n"
 
 
 #==============================================================================
@@ -549,6 +1166,8 @@ class DynamicTable(Table):
 
     unused_field = None
 
+    references = Table.references + ("unused_field",)
+
     def __init__(self, name="", size=0, offset=0, checksum=None, unused_field=None):
         Table.__init__(self, name, size, offset, checksum)
         self.unused_field = unused_field
@@ -565,34 +1184,32 @@ class DynamicTable(Table):
         self.offset.setData(data)
 
     def getSize(self):
+        self.load()
         return MUL_LENGTH * extract_data(self.size.getData())
 
     def setSize(self, size):
-        self.size.setData(bytes([size]))
-        self.reloadNode()
+        # size is in bytes, LengthField keeps it in multiples of MUL_LENGTH
+        self.load()
+        self.size.setData(size.to_bytes(2, byteorder=BYTORDER))
+        self.markDirty()
 
     def getUnusedSpaceSize(self):
+        self.load()
         return self.unused_field.getSize()
 
-    def reloadNode(self):
-        offset = 0x00
-        for component in self.componentsList:
-            component.reloadNode()
-
-        for component in self.root.componentsList:
-            if component.isPresent == False:
-                continue
+    def getFittingSize(self, field_size, data_len):
+        # Minimal table holding the new data of a field instead of its
+        # field_size bytes with at least one byte of unused space, the
+        # table both grows and shrinks to it
+        used_size = self.getSize() - self.getUnusedSpaceSize() - field_size
+        return alignSize(used_size + data_len + 1, MUL_LENGTH)
 
-            size = int(component.getSize() / MUL_LENGTH)
-
-            if size == 0:
-                component.setOffset(0)
-
-            component.setOffset(offset)
-            offset += size
+    def reloadNode(self):
+        self.reloadComponents()
+        self.root.relayout()
 
         commonHeader = self.root.componentsList[N_COMMON_HEADER]
-        commonHeader.reloadNode()
+        self.root.reloadChecksums([self, commonHeader])
 
 
 class StaticTable(Table):
@@ -613,8 +1230,70 @@ class StaticTable(Table):
         return 0
 
     def reloadNode(self):
+        self.reloadComponents()
+        self.reloadChecksum()
+
+class EERPOMTable(StaticTable):
+    """
+    Root of the tree. Changes of the fields only mark their area dirty,
+    dependent data is reloaded once for all the changes in refresh()
+    """
+
+    def relayout(self):
+        offset = 0x00
         for component in self.componentsList:
-            component.reloadNode()
+            if component.isPresent == False:
+                continue
+
+            # records of Multi Record Area are not aligned
+            size = alignSize(component.getSize(), MUL_OFFSET) // MUL_OFFSET
+
+            if size == 0:
+                component.setOffset(0)
+
+            component.setOffset(offset)
+            offset += size
+
+    def reloadChecksums(self, areas):
+        # checksums are updated by the changes of the areas,
+        # see ChecksumField.reloadNode
+        for area in areas:
+            if area.isPresent:
+                area.reloadChecksum()
+
+    def refresh(self):
+        if self.dirty == False:
+            return
+
+        self.dirty = False
+        areas = [self.componentsList[N_COMMON_HEADER]]
+        for component in self.componentsList:
+            if component.dirty:
+                component.dirty = False
+                component.reloadComponents()
+                areas.append(component)
+
+        self.relayout()
+        self.reloadChecksums(areas)
+
+    def reloadNode(self):
+        self.dirty = False
+        for component in self.componentsList:
+            component.dirty = False
+            component.reloadComponents()
+
+        self.relayout()
+        self.reloadChecksums(self.componentsList)
+
+    def getData(self):
+        self.refresh()
+        return StaticTable.getData(self)
+
+    def initFromBin(self, data, lazy=False):
+        # offsets of the areas are in Common Header, so it is never lazy
+        self.isPresent = True
+        for component in self.componentsList:
+            component.initFromBin(data, lazy & (component.number != N_COMMON_HEADER))
 
 class InternalUseAreaTable(DynamicTable):
     def getSize(self):
@@ -624,90 +1303,261 @@ class InternalUseAreaTable(DynamicTable):
 
         return chassisOffset - internalOffset
 
+class MultiRecordTable(StaticTable):
+    """
+    One record of Multi Record Area, its end of list flag is set by the area
+    """
 
-#==============================================================================
-# Auxiliary functions
-#==============================================================================
-def dataDescription(offset, data, width):
+    def getOffset(self):
+        return self.root.getOffset() + self.root.getComponentOffset(self)
 
-    description = "|"
-    ch = ''
-    dataLen = len(data)
-    i=0
+    def getSize(self):
+        return MULTI_RECORD_HEADER_SIZE + self.components[N_RECORD_LENGTH].getData()[0]
 
-    while i < dataLen:
-        byte = data[i]
-        ch = hex(byte)
-        description +=  " %-4s" % ch
+    def resetLayout(self):
+        Table.resetLayout(self)
+        if self.root != None:
+            self.root.resetLayout()
 
-        if ((i + 1) % width == 0) & (i + 1 != dataLen):
-            description += "\n" + " "*offset + "|"
+    def reloadComponents(self):
+        # header checksum covers the record checksum, so it is the last one
+        self.components[N_RECORD_CHECKSUM].reloadNode()
+        self.components[N_RECORD_HEADER_CHECKSUM].reloadNode()
 
-        i += 1
+    def getRecordType(self):
+        return self.components[N_RECORD_TYPE].getData()[0]
 
-    return description
+    def getRecordData(self):
+        return self.components[N_RECORD_DATA].getData()
 
-def merge_data(first_data, second_data):
+    def isEndOfList(self):
+        return self.components[N_RECORD_FORMAT].isEndOfList()
 
-    f_array = bitarray()
-    f_array.frombytes(first_data)
+    def setEndOfList(self, isLast):
+        self.components[N_RECORD_FORMAT].setEndOfList(isLast)
 
-    s_array = bitarray()
-    s_array.frombytes(second_data)
+class MultiRecordArea(DynamicTable):
+    """
+    Chain of records. Records are found by their type through the index
+    which is built once per change of the chain, see getRecords
+    """
 
-    return (f_array + s_array).tobytes()
+    # record type -> list of records
+    index = None
 
-def getbytes(data, start, end):
+    caches = DynamicTable.caches + ("index",)
+
+    def load(self):
+        self.materialize()
+        if self.pending is None:
+            return
+
+        data = self.pending
+        self.pending = None
+
+        area_offset = self.getOffset()
+        self.components = []
+        self.layout = []
+
+        for position, type_id, length in walkMultiRecords(data, area_offset):
+            record = newMultiRecordTable()
+            self.addComponent(record)
+            self.layout.append(position - area_offset)
+            record.initFromBin(data)
+
+    def getSize(self):
+        size = 0
+        for record in self.componentsList:
+            size += record.getSize()
+
+        return size
+
+    def setSize(self, size):
+        pass
+
+    def getUnusedSpaceSize(self):
+        return 0
+
+    def resetLayout(self):
+        Table.resetLayout(self)
+        self.index = None
+
+    def reloadComponents(self):
+        records = self.componentsList
+        for record in records:
+            record.setEndOfList(record is records[-1])
+            record.reloadNode()
+
+    def initFromIni(self, config, strict=False):
+        # [Multi Record Area]
+        # record_1_type=0x01
+        # record_1_data=01 02 03
+        try:
+            config = config[self.name]
+
+        except KeyError:
+            return
+
+        numbers = []
+        for key in config:
+            words = key.split('_')
+            if (len(words) == 3) and (words[0] == "record") and (words[2] == "type"):
+                try:
+                    numbers.append(int(words[1]))
+
+                except ValueError:
+                    if strict:
+                        raise ValueError("%s: Wrong record key: %s" % (self.name, key))
+
+                    e_print("Wrong record key: %s" % key)
+
+        for number in sorted(numbers):
+            try:
+                type_id = int(config["record_%i_type" % number], 0)
+                data = bytes.fromhex(config.get("record_%i_data" % number, ""))
+
+                if (type_id < 0) | (type_id > 0xff) | (len(data) > MULTI_RECORD_MAX_DATA_SIZE):
+                    raise ValueError
+
+            except ValueError:
+                if strict:
+                    raise ValueError("%s: Wrong type or data of record %i" % (self.name, number))
+
+                e_print("Wrong type or data of record %i" % number)
+                continue
+
+            self.addRecord(type_id, data)
+
+    def addRecord(self, type_id, data=b''):
+        record = newMultiRecordTable()
+        record.isPresent = True
+        for component in record.components:
+            component.isPresent = True
+
+        record.components[N_RECORD_TYPE].data = bytes([type_id])
+        self.addComponent(record)
+        record.components[N_RECORD_DATA].setData(data)
+
+        self.isPresent = True
+        self.resetLayout()
+        self.markDirty()
+
+        return record
+
+    def removeRecord(self, record):
+        records = list(self.componentsList)
+        records.remove(record)
+        self.setComponents(records)
+
+        if len(records) == 0:
+            self.isPresent = False
+            self.setOffset(0)
+
+        self.markDirty()
+
+    def getRecords(self, type_id):
+        if self.index == None:
+            self.index = {}
+            for record in self.componentsList:
+                self.index.setdefault(record.getRecordType(), []).append(record)
+
+        return self.index.get(type_id, [])
+
+    def getRecordOffsets(self, type_id):
+        return [record.getOffset() for record in self.getRecords(type_id)]
+
+
+#==============================================================================
+# Auxiliary functions
+#==============================================================================
+# cell of every byte value in hex dump
+HEX_CELLS = [" %-4s" % hex(byte) for byte in range(0x100)]
+
+def dataDescription(offset, data, width):
+    return ("\n" + " "*offset).join(iterDataDescription(data, width)) or "|"
+
+def iterDataDescription(data, width):
+    """
+    Yield rows of hex dump of the data, 'width' bytes per row
+    """
 
-    array = bitarray()
-    array.frombytes(data)
+    for start in range(0, len(data), width):
+        yield "|" + "".join([HEX_CELLS[byte] for byte in data[start:start + width]])
 
-    length = array.length()
-    bStart = length - start - 1
-    bEnd = length - end
+def walkMultiRecords(data, offset):
+    """
+    Yield (offset, type ID, data length) of every record of the chain which
+    begins at offset, up to the end of list flag or the end of the data
+    """
 
-    # <-start     end->
-    #  7 6 5 4 3 2 1 0
-    # +---------------+
-    # |0|0|1|0|1|1|1|1|
-    # +---------------+
+    position = offset
+    while position + MULTI_RECORD_HEADER_SIZE <= len(data):
+        end_of_list = getBits(data[position + 1], MASK_END_OF_LIST)
+        length = data[position + 2]
 
-    peace = array[bStart:bEnd]
+        yield position, data[position], length
 
-    pLen = peace.length()
+        position += MULTI_RECORD_HEADER_SIZE + length
+        if end_of_list:
+            break
 
-    byte_len = 8
-    rest = (byte_len - pLen) % byte_len
+def getChecksum(data):
+    # zero checksum: all the bytes of an area including checksum sum to 0
+    return -sum(data) & 0xff
 
-    zeroArr = bitarray(rest)
-    zeroArr.setall(False)
-    zeroArr += peace
+def alignSize(size, multiple):
+    return -(-size // multiple) * multiple
 
-    return zeroArr.tobytes()
+def getbytes(data, start, end):
+    value = extractBits(data, start, end)
+    return value.to_bytes((start - end) // 8 + 1, byteorder=BYTORDER)
 
 def extract_data(data, start=-1, end=-1):
     if (start == -1) & (end == -1):
         return int.from_bytes(data, byteorder=BYTORDER)
     else:
-        return int.from_bytes(getbytes(data, start, end), byteorder=BYTORDER)
+        return extractBits(data, start, end)
 
 def set_data(o_data, n_data, start, end):
+    return replaceBits(o_data, n_data, start, end)
+
+
+# Fields which values are given by describeTree
+DESCRIBED_FIELDS = (DataField, InfoField, DateTimeField, ChassisTypeField, LanguageTypeField, FirmwareField)
+
+def describeTree(eerpom):
+    """
+    Return { area name : { field config name : value } } of the present
+    areas: text of data fields, info of date, chassis type and language
+    fields, list of texts of custom records of info fields, hex of firmware
+    data. Records of Multi Record Area are list of { "type", "data" }
+    under "records".
+    """
+
+    areas = {}
+    for area in eerpom.componentsList:
+        if (area.isPresent == False) | (area.number == N_COMMON_HEADER):
+            continue
+
+        fields = {}
+        for component in area.componentsList:
+            if isinstance(component, MultiRecordTable):
+                record = { "type" : component.getRecordType(), "data" : bytes(component.getRecordData()).hex() }
+                fields.setdefault("records", []).append(record)
+            elif isinstance(component, DESCRIBED_FIELDS) == False:
+                continue
+            elif isinstance(component, DataField):
+                fields[component.getConfigName()] = component.getText()
+            elif isinstance(component, InfoField):
+                fields[component.getConfigName()] = [Encoding.decode(type_code, data) for type_code, data in component.iterRecords()]
+            elif isinstance(component, (DateTimeField, ChassisTypeField, LanguageTypeField)):
+                fields[component.getConfigName()] = component.getInfo()
+            elif isinstance(component, FirmwareField):
+                fields[component.getConfigName()] = bytes(component.getData()).hex()
 
-        old_data = bitarray()
-        old_data.frombytes(o_data)
-        new_data = bitarray()
-        new_data.frombytes(n_data)
-
-        length = len(new_data)
-        bStart = length - start - 1
-        bEnd = length - end
-
-        first_peace = old_data[:bStart]
-        second_peace = old_data[bEnd:]
-
-        ret_data = first_peace + new_data[length - (bEnd - bStart):] + second_peace
-        return ret_data.tobytes()
+        areas[area.name] = fields
 
+    return areas
 
 def showChassisTypes():
     for chInfo in infoChassisTypes:
@@ -717,265 +1567,510 @@ def showLanguageTypes():
     for lInfo in infoLanguageCodes:
         print("{ShortName} {Code} {FullName}".format(**lInfo))
 
-def initEERPOMTree():
+#==============================================================================
+# EERPOM schema
+#==============================================================================
 
 # CAUTION: Before change field name see method Field.initFromIni
 # example: Part Number type/length -> part_number_type_length
 
-# name mangling variableType_tableName_[variableName]
-# f - field
-# t = table
+# Every area is (name, table class, name of its offset field in Common Header,
+# fields), every field is (name, field class, size). Size of a data field is
+# None, its size is kept in the type/length field just before it. Length,
+# unused space and checksum fields of an area are found by their classes.
+
+EERPOM_SCHEMA = [
+
+    ("Common Header", StaticTable, None, [
+        ("Format Version", FormatVersionField, 1),
+        ("Internal Use Area Offset", OffsetField, 1),
+        ("Chassis Info Area Offset", OffsetField, 1),
+        ("Board Info Area Offset", OffsetField, 1),
+        ("Product Info Area Offset", OffsetField, 1),
+        ("Multi Record Area Offset", OffsetField, 1),
+        ("PAD", Field, 1),
+        ("Checksum", ChecksumField, 1),
+    ]),
+
+    ("Internal Use Area", InternalUseAreaTable, "Internal Use Area Offset", [
+        ("Internal Use Format Version", FormatVersionField, 1),
+        ("Firmware data", FirmwareField, 0),
+    ]),
+
+    ("Chassis Info Area", DynamicTable, "Chassis Info Area Offset", [
+        ("Format Version", FormatVersionField, 1),
+        ("Length", LengthField, 1),
+        ("Chassis Type", ChassisTypeField, 1),
+        ("Part Number type/length", TypeField, 1),
+        ("Part Number Data", DataField, None),
+        ("Serial Number type/length", TypeField, 1),
+        ("Serial Number Data", DataField, None),
+        ("Info fields", InfoField, 0),
+        ("Any remaining unused space", UnusedField, 0),
+        ("Checksum", ChecksumField, 1),
+    ]),
+
+    ("Board Info Area", DynamicTable, "Board Info Area Offset", [
+        ("Format Version", FormatVersionField, 1),
+        ("Length", LengthField, 1),
+        ("Language Code", LanguageTypeField, 1),
+        ("Mfg Date/Time", DateTimeField, 3),
+        ("Manufacturer type/length", TypeField, 1),
+        ("Manufacturer Data", DataField, None),
+        ("Product Name type/length", TypeField, 1),
+        ("Product Name Data", DataField, None),
+        ("Serial Number type/length", TypeField, 1),
+        ("Serial Number Data", DataField, None),
+        ("Part Number type/length", TypeField, 1),
+        ("Part Number Data", DataField, None),
+        ("FRU File ID type/length", TypeField, 1),
+        ("FRU File ID Data", DataField, None),
+        ("Additional custom Mfg", InfoField, 0),
+        ("Any remaining unused space", UnusedField, 0),
+        ("Checksum", ChecksumField, 1),
+    ]),
+
+    ("Product Info Area", DynamicTable, "Product Info Area Offset", [
+        ("Format Version", FormatVersionField, 1),
+        ("Length", LengthField, 1),
+        ("Language Code", LanguageTypeField, 1),
+        ("Manufacturer Name type/length", TypeField, 1),
+        ("Manufacturer Name Data", DataField, None),
+        ("Product Name type/length", TypeField, 1),
+        ("Product Name Data", DataField, None),
+        ("Part Number type/length", TypeField, 1),
+        ("Part Number Data", DataField, None),
+        ("Version type/length", TypeField, 1),
+        ("Version Data", DataField, None),
+        ("Serial Number type/length", TypeField, 1),
+        ("Serial Number Data", DataField, None),
+        ("Asset Tag type/length", TypeField, 1),
+        ("Asset Tag Data", DataField, None),
+        ("FRU File ID type/length", TypeField, 1),
+        ("FRU File ID Data", DataField, None),
+        ("Custom product info area", InfoField, 0),
+        ("Any remaining unused space", UnusedField, 0),
+        ("Checksum", ChecksumField, 1),
+    ]),
+
+    ("Multi Record Area", MultiRecordArea, "Multi Record Area Offset", []),
+]
+
+# Fields of a record of Multi Record Area, the size of record data
+# is kept in Record Length
+MULTI_RECORD_SCHEMA = [
+    ("Record Type ID", RecordTypeField, 1),
+    ("End of List/Version", RecordFormatField, 1),
+    ("Record Length", RecordLengthField, 1),
+    ("Record Checksum", RecordChecksumField, 1),
+    ("Header Checksum", RecordChecksumField, 1),
+    ("Record Data", RecordDataField, None),
+]
 
 #==============================================================================
-# Init Common Header Table
+# Area codec
 #==============================================================================
+class AreaCodec:
+    """
+    Area layout compiled from the schema: fixed size fields at the beginning
+    of the area are packed with one struct, the rest of the fields are
+    walked by their kind (type/length + data pairs, info, unused, checksum)
+    """
+
+    prefix = None
+    prefixSpans = None
+    steps = None
+    lengthPosition = None
+
+    def __init__(self, fields):
+        self.prefixSpans = []
+        position = 0
+
+        for name, field_class, size in fields:
+            if field_class.codecKind != KIND_FIXED:
+                break
 
-    t_ch = StaticTable(name="Common Header",
-                       size=SUGGESTED_SIZE_COMMON_HEADER)
-
-    f_ch_format_version = FormatVersionField("Format Version", 1)
-    f_ch_pad = Field("PAD", 1)
-    f_ch_checksum = ChecksumField("Checksum", 1)
-    f_ch_offset_iua = OffsetField("Internal Use Area Offset", 1)
-    f_ch_offset_cia = OffsetField("Chassis Info Area Offset", 1)
-    f_ch_offset_bia = OffsetField("Board Info Area Offset", 1)
-    f_ch_offset_pia = OffsetField("Product Info Area Offset", 1)
-    f_ch_offset_mria = OffsetField("Multi Record Area Offset", 1)
-
-    t_ch.addComponent(f_ch_format_version)
-    t_ch.addComponent(f_ch_offset_iua)
-    t_ch.addComponent(f_ch_offset_cia)
-    t_ch.addComponent(f_ch_offset_bia)
-    t_ch.addComponent(f_ch_offset_pia)
-    t_ch.addComponent(f_ch_offset_mria)
-    t_ch.addComponent(f_ch_pad)
-    t_ch.addComponent(f_ch_checksum)
+            if issubclass(field_class, LengthField):
+                self.lengthPosition = position
 
-#==============================================================================
-# + Init Internal Use Area Table
-#==============================================================================
+            self.prefixSpans.append((position, size))
+            position += size
 
-    t_iua = InternalUseAreaTable(name="Internal Use Area", offset=f_ch_offset_iua)
+        count = len(self.prefixSpans)
+        self.prefix = struct.Struct("".join(["%is" % size for position, size in self.prefixSpans]))
+        self.steps = [(field_class.codecKind, size) for name, field_class, size in fields[count:]]
 
-    f_iua_format_version = FormatVersionField("Internal Use Format Version", 1)
-    f_firm_data = FirmwareField("Firmware data")
+    def getAreaSize(self, data, offset):
+        if self.lengthPosition == None:
+            return None
 
-    t_iua.addComponent(f_iua_format_version)
-    t_iua.addComponent(f_firm_data)
+        return MUL_LENGTH * data[offset + self.lengthPosition]
 
+    def decode(self, data, offset, size=None):
+        """
+        Return (offset, length) of every field relative to the area offset,
+        size is needed only for areas without length field
+        """
 
-#==============================================================================
-# + Init Chassis Info Area Table
-#==============================================================================
+        area_size = self.getAreaSize(data, offset)
+        if area_size == None:
+            area_size = size
+
+        spans = list(self.prefixSpans)
+        position = self.prefix.size
+        data_len = 0
+
+        for kind, size in self.steps:
+            if kind == KIND_TYPE_LENGTH:
+                data_len = getBits(data[offset + position], MASK_LENGTH)
+                size = 1
+            elif kind == KIND_DATA:
+                size = data_len
+            elif kind == KIND_INFO:
+                size = getInfoFieldSize(data, offset + position, offset + area_size)
+            elif kind == KIND_UNUSED:
+                size = max(area_size - position - 1, 0)
+            elif kind == KIND_TAIL:
+                size = max(area_size - position, 0)
+
+            spans.append((position, size))
+            position += size
+
+        return spans
+
+    def encode(self, chunks):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+
+        data = bytearray(size)
+        count = len(self.prefixSpans)
+
+        prefix = chunks[:count]
+        for (position, length), chunk in zip(self.prefixSpans, prefix):
+            if len(chunk) != length:
+                # wrong sized field is copied as is, see below
+                count = 0
+                break
+
+        if count != 0:
+            self.prefix.pack_into(data, 0, *[bytes(chunk) for chunk in prefix])
+
+        view = memoryview(data)
+        position = self.prefix.size if count != 0 else 0
+        for chunk in chunks[count:]:
+            view[position:position + len(chunk)] = chunk
+            position += len(chunk)
+
+        return bytes(data)
+
+def compileSchema(schema):
+    codecs = {}
+    for name, table_class, offset_name, fields in schema:
+        codecs[name] = AreaCodec(fields)
+
+    return codecs
 
-    f_cia_format_version = FormatVersionField("Format Version", 1)
-    f_cia_len = LengthField("Length", 1)
-    f_cia_type = ChassisTypeField("Chassis Type", 1)
+AREA_CODECS = compileSchema(EERPOM_SCHEMA)
 
-    f_cia_part_numbers_len = TypeField("Part Number type/length", 1)
-    f_cia_part_numbers_data = DataField("Part Number Data", size=f_cia_part_numbers_len)
+def iterInfoRecords(data, start=0, end=None):
+    """
+    Yield (offset, type/length byte, data) of every custom record up to
+    INFO_FIELD_END_BYTE, data is a memoryview of the given data. Records are
+    walked by their lengths, so their data may hold any bytes.
+    """
 
-    f_cia_serial_numbers_len = TypeField("Serial Number type/length", 1)
-    f_cia_serial_numbers_data = DataField("Serial Number Data", size=f_cia_serial_numbers_len)
+    view = memoryview(data)
+    if end == None:
+        end = len(view)
 
-    f_cia_info_field = InfoField("Info fields")
-    f_cia_unused_space = UnusedField("Any remaining unused space")
-    f_cia_checksum = ChecksumField("Checksum", 1)
+    position = start
+    while position < end:
+        type_length = view[position]
+        if type_length == INFO_FIELD_END_BYTE:
+            break
 
+        size = getBits(type_length, MASK_LENGTH)
+        yield position, type_length, view[position + 1:min(position + 1 + size, end)]
+        position += 1 + size
 
-    t_cia = DynamicTable(name="Chassis Info Area",
-                         offset=f_ch_offset_cia,
-                         size=f_cia_len,
-                         unused_field=f_cia_unused_space)
+def getInfoFieldSize(data, start, end):
+    position = start
+    while position < end:
+        if data[position] == INFO_FIELD_END_BYTE:
+            return position - start + 1
 
-    t_cia.addComponent(f_cia_format_version)
-    t_cia.addComponent(f_cia_len)
-    t_cia.addComponent(f_cia_type)
+        position += 1 + getBits(data[position], MASK_LENGTH)
 
-    t_cia.addComponent(f_cia_part_numbers_len)
-    t_cia.addComponent(f_cia_part_numbers_data)
+    # info field which starts past the end of a corrupt area is empty
+    return max(end - start, 0)
 
-    t_cia.addComponent(f_cia_serial_numbers_len)
-    t_cia.addComponent(f_cia_serial_numbers_data)
+def decodeImage(data):
+    """
+    Return list of (area offset, field spans) for every area of the image,
+    None for areas which are not present. Only the codecs are used, the
+    tree is not built.
+    """
 
-    t_cia.addComponent(f_cia_info_field)
+    view = memoryview(data)
+    header_codec = AREA_CODECS[EERPOM_SCHEMA[N_COMMON_HEADER][0]]
+    areas = [(0, header_codec.decode(view, 0, SUGGESTED_SIZE_COMMON_HEADER))]
 
-    t_cia.addComponent(f_cia_unused_space)
-    t_cia.addComponent(f_cia_checksum)
+    for number, (name, table_class, offset_name, fields) in enumerate(EERPOM_SCHEMA):
+        if number == N_COMMON_HEADER:
+            continue
+
+        # offsets missing from a truncated header are 0, as in the tree
+        offset = MUL_OFFSET * view[number] if number < len(view) else 0
+        if offset == 0:
+            areas.append(None)
+            continue
+
+        # same as InternalUseAreaTable.getSize
+        size = MUL_OFFSET * view[N_CHASSIS_INFO_AREA] - offset
+        areas.append((offset, AREA_CODECS[name].decode(view, offset, size)))
+
+    return areas
 
 #==============================================================================
-# + Init Board Info Area Table
+# EERPOM tree
 #==============================================================================
+def initEERPOMTree():
 
-    f_bia_format_version = FormatVersionField("Format Version", 1)
-    f_bia_len = LengthField("Length", 1)
-    f_bia_language_code = LanguageTypeField("Language Code", 1)
-    f_bia_mfg = DateTimeField("Mfg Date/Time", 3)
+    t_eerpom = EERPOMTable("EERPOM")
+    t_ch = None
 
-    f_bia_board_manufacturer_len = TypeField("Manufacturer type/length", 1)
-    f_bia_board_manufacturer_data = DataField("Manufacturer Data", size=f_bia_board_manufacturer_len)
+    for name, table_class, offset_name, fields in EERPOM_SCHEMA:
 
-    f_bia_board_product_name_len = TypeField("Product Name type/length", 1)
-    f_bia_board_product_name_data = DataField("Product Name Data", size=f_bia_board_product_name_len)
+        components = []
+        for field_name, field_class, size in fields:
+            if size == None:
+                size = components[-1]
 
-    f_bia_serial_number_len = TypeField("Serial Number type/length", 1)
-    f_bia_serial_number_data = DataField("Serial Number Data", size=f_bia_serial_number_len)
+            components.append(field_class(field_name, size))
 
-    f_bia_part_number_len = TypeField("Part Number type/length", 1)
-    f_bia_part_number_data = DataField("Part Number Data", size=f_bia_part_number_len)
+        arguments = { "name" : name }
 
-    f_bia_fru_file_id_len = TypeField("FRU File ID type/length", 1)
-    f_bia_fru_file_id_data = DataField("FRU File ID Data", size=f_bia_fru_file_id_len)
+        if t_ch == None:
+            arguments["size"] = SUGGESTED_SIZE_COMMON_HEADER
+        else:
+            for component in t_ch.components:
+                if component.name == offset_name:
+                    arguments["offset"] = component
 
-    f_bia_mfg_info_field = InfoField("Additional custom Mfg")
+        for component in components:
+            if isinstance(component, LengthField):
+                arguments["size"] = component
+            elif isinstance(component, ChecksumField):
+                arguments["checksum"] = component
+            elif isinstance(component, UnusedField):
+                arguments["unused_field"] = component
 
-    f_bia_unused_space = UnusedField("Any remaining unused space")
+        table = table_class(**arguments)
+        table.codec = AREA_CODECS[name]
 
-    f_bia_checksum = ChecksumField("Checksum", 1)
+        for component in components:
+            table.addComponent(component)
 
-    t_bia = DynamicTable("Board Info Area",
-                         offset=f_ch_offset_bia,
-                         size=f_bia_len,
-                         unused_field=f_bia_unused_space)
+        t_eerpom.addComponent(table)
 
-    t_bia.addComponent(f_bia_format_version)
-    t_bia.addComponent(f_bia_len)
-    t_bia.addComponent(f_bia_language_code)
-    t_bia.addComponent(f_bia_mfg)
+        if t_ch == None:
+            t_ch = table
 
-    t_bia.addComponent(f_bia_board_manufacturer_len)
-    t_bia.addComponent(f_bia_board_manufacturer_data)
+    return t_eerpom
 
-    t_bia.addComponent(f_bia_board_product_name_len)
-    t_bia.addComponent(f_bia_board_product_name_data)
+def initMultiRecordTable():
+    record = MultiRecordTable("Multi Record")
 
-    t_bia.addComponent(f_bia_serial_number_len)
-    t_bia.addComponent(f_bia_serial_number_data)
+    for field_name, field_class, size in MULTI_RECORD_SCHEMA:
+        if size == None:
+            size = record.components[N_RECORD_LENGTH]
 
-    t_bia.addComponent(f_bia_part_number_len)
-    t_bia.addComponent(f_bia_part_number_data)
+        record.addComponent(field_class(field_name, size))
 
-    t_bia.addComponent(f_bia_fru_file_id_len)
-    t_bia.addComponent(f_bia_fru_file_id_data)
+    return record
 
-    t_bia.addComponent(f_bia_mfg_info_field)
+class TreeTemplate:
+    """
+    Tree which is cloned instead of being built again. Nodes of the tree are
+    flattened once together with the links between them, a clone is a
+    shallow copy of every node (names and data are shared) with the links
+    switched to the copies.
 
-    t_bia.addComponent(f_bia_unused_space)
+    Components of the deferred tables may be left out of a clone, they are
+    cloned on the first load of their table, see Table.materialize. So a
+    tree which is read partly costs only the tables which are read.
+    """
 
-    t_bia.addComponent(f_bia_checksum)
+    nodes = None
 
-#==============================================================================
-# + Init Product Info Area Table
-#==============================================================================
+    # node numbers of the deferred tables
+    deferred = None
 
-    f_pia_format_version = FormatVersionField("Format Version", 1)
-    f_pia_len = LengthField("Length", 1)
-    f_pia_language_code = LanguageTypeField("Language Code", 1)
+    # (numbers, links, tables, caches) of every group of nodes: group 0 is
+    # cloned at once, group n are the components of the n-th deferred table
+    groups = None
 
-    f_pia_manufacturer_name_len = TypeField("Manufacturer Name type/length", 1)
-    f_pia_manufacturer_name_data = DataField("Manufacturer Name Data", f_pia_manufacturer_name_len)
+    def __init__(self, tree, deferred=()):
+        self.nodes = []
+        self.addNode(tree)
 
-    f_pia_name_len = TypeField("Product Name type/length", 1)
-    f_pia_name_data = DataField("Product Name Data", f_pia_name_len)
+        index = {}
+        for number, node in enumerate(self.nodes):
+            index[node] = number
 
-    f_pia_product_part_number_len = TypeField("Part Number type/length", 1)
-    f_pia_product_part_number_data = DataField("Part Number Data", f_pia_product_part_number_len)
+        node_groups = [0] * len(self.nodes)
+        self.deferred = []
+        for group, table in enumerate(deferred, 1):
+            self.deferred.append(index[table])
+            for component in getDescendants(table):
+                node_groups[index[component]] = group
 
-    f_pia_product_version_len = TypeField("Version type/length", 1)
-    f_pia_product_version_data = DataField("Version Data", f_pia_product_version_len)
+        self.groups = [([], [], [], []) for group in range(len(self.deferred) + 1)]
+        for number, node in enumerate(self.nodes):
+            group = node_groups[number]
+            numbers, links, tables, caches = self.groups[group]
 
-    f_pia_serial_number_len  = TypeField("Serial Number type/length", 1)
-    f_pia_serial_number_data = DataField("Serial Number Data", f_pia_serial_number_len)
+            numbers.append(number)
 
-    f_pia_asset_tag_len = TypeField("Asset Tag type/length", 1)
-    f_pia_asset_tag_data = DataField("Asset Tag Data", f_pia_asset_tag_len)
+            for name in node.caches:
+                caches.append((number, name))
 
-    f_pia_fru_file_id_len = TypeField("FRU File ID type/length", 1)
-    f_pia_fru_file_id_data = DataField("FRU File ID Data", f_pia_fru_file_id_len)
+            for name in node.references:
+                value = getattr(node, name, None)
+                if isinstance(value, Component):
+                    target = index[value]
+                    target_group = node_groups[target]
+                    if (group != 0) & (target_group != 0) & (group != target_group):
+                        raise ValueError("Deferred table '%s' refers to another one" % node.name)
 
-    f_pia_custom_info = InfoField("Custom product info area")
+                    # link is set once both of the nodes are cloned
+                    self.groups[max(group, target_group)][1].append((number, name, target))
 
-    f_pia_unused_space = UnusedField("Any remaining unused space" )
+            if isinstance(node, Table):
+                children = [index[component] for component in node.components]
+                if number in self.deferred:
+                    group = self.deferred.index(number) + 1
 
-    f_pia_checksum = ChecksumField("Checksum", 1)
+                self.groups[group][2].append((number, children))
 
-    t_pia = DynamicTable("Product Info Area",
-                         offset=f_ch_offset_pia,
-                         size=f_pia_len,
-                         unused_field=f_pia_unused_space)
+    def addNode(self, node):
+        self.nodes.append(node)
+        if isinstance(node, Table):
+            for component in node.componentsList:
+                self.addNode(component)
 
-    t_pia.addComponent(f_pia_format_version)
-    t_pia.addComponent(f_pia_len)
-    t_pia.addComponent(f_pia_language_code)
+    def clone(self, deferred=False):
+        """
+        deferred - components of the deferred tables are cloned on the first
+        load of their table
+        """
 
-    t_pia.addComponent(f_pia_manufacturer_name_len)
-    t_pia.addComponent(f_pia_manufacturer_name_data)
+        copies = [None] * len(self.nodes)
+        self.cloneGroup(copies, 0)
 
-    t_pia.addComponent(f_pia_name_len)
-    t_pia.addComponent(f_pia_name_data)
+        for group, number in enumerate(self.deferred, 1):
+            if deferred:
+                copies[number].components = None
+                copies[number].deferred = (self, copies, group)
+            else:
+                self.cloneGroup(copies, group)
 
-    t_pia.addComponent(f_pia_product_part_number_len)
-    t_pia.addComponent(f_pia_product_part_number_data)
+        return copies[0]
 
-    t_pia.addComponent(f_pia_product_version_len)
-    t_pia.addComponent(f_pia_product_version_data)
+    def cloneGroup(self, copies, group):
+        numbers, links, tables, caches = self.groups[group]
 
-    t_pia.addComponent(f_pia_serial_number_len)
-    t_pia.addComponent(f_pia_serial_number_data)
+        for number in numbers:
+            node = self.nodes[number]
+            copy = object.__new__(type(node))
+            copy.__dict__ = node.__dict__.copy()
+            copies[number] = copy
 
-    t_pia.addComponent(f_pia_asset_tag_len)
-    t_pia.addComponent(f_pia_asset_tag_data)
+        for number, name, target in links:
+            setattr(copies[number], name, copies[target])
 
-    t_pia.addComponent(f_pia_fru_file_id_len)
-    t_pia.addComponent(f_pia_fru_file_id_data)
+        for number, children in tables:
+            copies[number].components = [copies[child] for child in children]
 
-    t_pia.addComponent(f_pia_custom_info)
+        # caches of the tree refer to its own nodes
+        for number, name in caches:
+            setattr(copies[number], name, None)
 
-    t_pia.addComponent(f_pia_unused_space)
+def getDescendants(table):
+    descendants = []
+    for component in table.componentsList:
+        descendants.append(component)
+        if isinstance(component, Table):
+            descendants += getDescendants(component)
 
-    t_pia.addComponent(f_pia_checksum)
+    return descendants
 
+# Template of the pristine tree, see newEERPOMTree
+treeTemplate = None
 
-#==============================================================================
-# + Init MultiRecord Area Table
-#==============================================================================
+def newEERPOMTree(deferred=False):
+    """
+    Same tree as initEERPOMTree() returns, but cloned from the template
+    which is built once per process. deferred - fields of the areas are
+    cloned on the first access to the area
+    """
 
-    t_mria = DynamicTable("Multi Record Area", offset=f_ch_offset_mria)
+    global treeTemplate
 
-#==============================================================================
-# Create EERPOM table
-#==============================================================================
+    if treeTemplate == None:
+        tree = initEERPOMTree()
+        areas = [area for area in tree.components if area.number != N_COMMON_HEADER]
+        treeTemplate = TreeTemplate(tree, areas)
 
-    t_eerpom = StaticTable("EERPOM")
+    return treeTemplate.clone(deferred)
 
-    t_eerpom.addComponent(t_ch)
-    t_eerpom.addComponent(t_iua)
-    t_eerpom.addComponent(t_cia)
-    t_eerpom.addComponent(t_bia)
-    t_eerpom.addComponent(t_pia)
-    t_eerpom.addComponent(t_mria)
+# Template of a record of Multi Record Area, see newMultiRecordTable
+recordTemplate = None
 
-    return t_eerpom
+def newMultiRecordTable():
+    global recordTemplate
 
-def initFromBin(binFile):
-    eerpom = initEERPOMTree()
+    if recordTemplate == None:
+        recordTemplate = TreeTemplate(initMultiRecordTable())
 
-    with open(binFile, 'rb') as fd:
-        data = fd.read()
-        eerpom.initFromBin(data)
+    return recordTemplate.clone()
 
+def initFromData(data, lazy=False):
+    # data may be any bytes-like object, memoryview slices of it are
+    # kept in the fields without copying.
+    # lazy - areas are parsed on the first access to their components
+    if lazy:
+        data = memoryview(data)
+
+    eerpom = newEERPOMTree(lazy)
+    eerpom.initFromBin(data, lazy)
 
     return eerpom
 
-def initFromIni(iniFile):
-    eerpom = initEERPOMTree()
+def initFromBin(binFile, lazy=False):
+    with open(binFile, 'rb') as fd:
+        data = fd.read()
+
+    return initFromData(data, lazy)
 
+def initFromIni(iniFile):
     config = configparser.ConfigParser()
     config.read(iniFile)
 
+    return initFromConfig(config)
+
+def initFromConfig(config, strict=False):
+    """
+    strict - ValueError "Area Name.field_name: error" for the first wrong
+    value instead of error messages
+    """
+
+    eerpom = newEERPOMTree()
+
     eerpom.isPresent = True
     for component in eerpom.componentsList:
-        component.initFromIni(config)
+        component.initFromIni(config, strict)
 
 
 
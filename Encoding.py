@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Encodings of the type/length fields: binary, BCD plus,
+# packed 6-bit ASCII and 8-bit ASCII + Latin 1
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+# Type codes of type/length byte
+TYPE_CODE_BINARY = 0
+TYPE_CODE_BCD_PLUS = 1
+TYPE_CODE_6BIT_ASCII = 2
+TYPE_CODE_8BIT_ASCII = 3
+
+# Encoding is chosen by the data, see encodeAuto
+ENCODING_AUTO = "auto"
+
+BCD_PLUS_CHARS = "0123456789 -."
+BCD_PLUS_PAD = BCD_PLUS_CHARS.index(" ")
+
+SIX_BIT_FIRST_CHAR = 0x20
+SIX_BIT_CHARS = 64
+
+#==============================================================================
+# Encoders and decoders
+#==============================================================================
+def encodeBinary(text):
+    # binary data is given as hex string, example: 01 a2 ff
+    return bytes.fromhex(text)
+
+def decodeBinary(data):
+    return " ".join(["%02x" % byte for byte in data])
+
+def encodeBcdPlus(text):
+    values = []
+    for char in text:
+        value = BCD_PLUS_CHARS.find(char)
+        if value == -1:
+            raise ValueError("'%s' is not BCD plus character" % char)
+
+        values.append(value)
+
+    if len(values) % 2:
+        values.append(BCD_PLUS_PAD)
+
+    return bytes([(values[i] << 4) | values[i + 1] for i in range(0, len(values), 2)])
+
+def decodeBcdPlus(data):
+    chars = []
+    for byte in data:
+        for value in (byte >> 4, byte & 0x0f):
+            # 0xD - 0xF are reserved
+            chars.append(BCD_PLUS_CHARS[value] if value < len(BCD_PLUS_CHARS) else "?")
+
+    return "".join(chars)
+
+def encode6bitAscii(text):
+    # 4 characters are packed into 3 bytes, the first character
+    # is in the least significant bits of the first byte
+    data = bytearray()
+    value = 0
+    bits = 0
+
+    for char in text:
+        code = ord(char) - SIX_BIT_FIRST_CHAR
+        if (code < 0) | (code >= SIX_BIT_CHARS):
+            raise ValueError("'%s' is not 6-bit ASCII character" % char)
+
+        value |= code << bits
+        bits += 6
+
+        while bits >= 8:
+            data.append(value & 0xff)
+            value >>= 8
+            bits -= 8
+
+    if bits:
+        data.append(value)
+
+    return bytes(data)
+
+def decode6bitAscii(data):
+    chars = []
+    value = 0
+    bits = 0
+
+    for byte in data:
+        value |= byte << bits
+        bits += 8
+
+        while bits >= 6:
+            chars.append(chr(SIX_BIT_FIRST_CHAR + (value & 0x3f)))
+            value >>= 6
+            bits -= 6
+
+    return "".join(chars)
+
+def encode8bitAscii(text):
+    return text.encode("iso-8859-1")
+
+def decode8bitAscii(data):
+    return str(data, "iso-8859-1")
+
+ENCODING = namedtuple("Encoding", "name encode decode")
+
+ENCODINGS = {
+    TYPE_CODE_BINARY : ENCODING("binary", encodeBinary, decodeBinary),
+    TYPE_CODE_BCD_PLUS : ENCODING("bcd", encodeBcdPlus, decodeBcdPlus),
+    TYPE_CODE_6BIT_ASCII : ENCODING("6bit", encode6bitAscii, decode6bitAscii),
+    TYPE_CODE_8BIT_ASCII : ENCODING("8bit", encode8bitAscii, decode8bitAscii),
+}
+
+# Text encodings from the densest one
+AUTO_TYPE_CODES = (TYPE_CODE_BCD_PLUS, TYPE_CODE_6BIT_ASCII, TYPE_CODE_8BIT_ASCII)
+
+#==============================================================================
+# Interface
+#==============================================================================
+def getTypeCode(name):
+    """
+    Type code of the encoding name, ValueError for unknown names
+    """
+
+    for type_code, encoding in ENCODINGS.items():
+        if encoding.name == name:
+            return type_code
+
+    raise ValueError("Unknown encoding '%s', use one of: %s" % (name, ", ".join(getEncodingNames())))
+
+def getEncodingNames():
+    return [ENCODING_AUTO] + [ENCODINGS[type_code].name for type_code in sorted(ENCODINGS)]
+
+def encode(type_code, text):
+    return ENCODINGS[type_code].encode(text)
+
+def decode(type_code, data):
+    return ENCODINGS[type_code].decode(data)
+
+def encodeAuto(text):
+    """
+    Return (type code, data) of the densest encoding which keeps the text,
+    BCD plus and 6-bit ASCII may only pad it with spaces
+    """
+
+    for type_code in AUTO_TYPE_CODES:
+        try:
+            data = encode(type_code, text)
+
+        except ValueError:
+            continue
+
+        decoded = decode(type_code, data)
+        if (decoded[:len(text)] == text) & (decoded[len(text):].strip(" ") == ""):
+            return type_code, data
+
+    raise ValueError("'%s' can't be encoded" % text)
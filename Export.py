@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Bulk export of decoded fields of FRU images: JSON Lines or CSV row per
+# image, or columnar directory with one json array per field. Images are
+# read one by one, memory does not grow with their number past the size
+# of the parse cache, see CompactImage.ParseCache
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+import EERPOM
+import Batch
+import CompactImage
+import Index
+import csv
+import json
+import os
+import sys
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+EXPORT_FORMATS = ("jsonl", "csv", "columnar")
+
+# Columns besides the fields, keys of the fields are
+# "Area Name.field_name" as in the manifest
+FILE_COLUMN = Batch.MANIFEST_FILE_KEY
+ERROR_COLUMN = "error"
+RECORDS_FIELD = "records"
+
+COLUMN_SUFFIX = ".json"
+
+#==============================================================================
+# Rows
+#==============================================================================
+def getColumns():
+    """
+    Return columns of all the images, the same for every image:
+    file, fields of the schema as "Area Name.field_name", error
+    """
+
+    columns = [FILE_COLUMN]
+    eerpom = EERPOM.newEERPOMTree()
+
+    for area in eerpom.componentsList:
+        if area.number == EERPOM.N_COMMON_HEADER:
+            continue
+
+        if area.number == EERPOM.N_MULTI_RECORD_AREA:
+            columns.append(getColumn(area.name, RECORDS_FIELD))
+            continue
+
+        for component in area.componentsList:
+            if isinstance(component, EERPOM.DESCRIBED_FIELDS):
+                columns.append(getColumn(area.name, component.getConfigName()))
+
+    columns.append(ERROR_COLUMN)
+    return columns
+
+def getColumn(area_name, field_name):
+    return area_name + Batch.MANIFEST_KEY_SEPARATOR + field_name
+
+def iterImageFiles(paths):
+    # directories are walked as by the index
+    for path in paths:
+        if os.path.isdir(path):
+            yield from Index.iterImageFiles(path)
+        else:
+            yield path
+
+def getRow(path):
+    """
+    Return { column : value } of the image, fields of absent areas
+    are missing
+    """
+
+    row = { FILE_COLUMN : path }
+
+    try:
+        # unchanged images are described once, see CompactImage.ParseCache
+        areas = CompactImage.getParseCache().readImage(path).describe()
+
+    except (OSError, IndexError, ValueError) as e:
+        row[ERROR_COLUMN] = str(e)
+        return row
+
+    for area_name, fields in areas.items():
+        for field_name, value in fields.items():
+            row[getColumn(area_name, field_name)] = value
+
+    return row
+
+def iterRows(paths):
+    for path in iterImageFiles(paths):
+        yield getRow(path)
+
+#==============================================================================
+# Writers
+#==============================================================================
+def exportJsonl(paths, output):
+    count = 0
+    for row in iterRows(paths):
+        output.write(json.dumps(row) + "\n")
+        count += 1
+
+    return count
+
+def exportCsv(paths, output):
+    # lists (custom records, multi records) are json in their cells
+    columns = getColumns()
+    writer = csv.DictWriter(output, columns, lineterminator="\n")
+    writer.writeheader()
+
+    count = 0
+    for row in iterRows(paths):
+        for key, value in row.items():
+            if isinstance(value, list):
+                row[key] = json.dumps(value)
+
+        writer.writerow(row)
+        count += 1
+
+    return count
+
+def getColumnFile(column):
+    return column.replace('/', '_').replace(' ', '_').lower() + COLUMN_SUFFIX
+
+def exportColumnar(paths, directory):
+    """
+    Every column is json array in its own file of the directory, the n-th
+    element of every array belongs to the n-th image, null for no value
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    columns = getColumns()
+    files = {}
+
+    try:
+        for column in columns:
+            files[column] = open(os.path.join(directory, getColumnFile(column)), 'w')
+            files[column].write("[")
+
+        count = 0
+        for row in iterRows(paths):
+            separator = "," if count else ""
+            for column in columns:
+                files[column].write(separator + json.dumps(row.get(column)))
+
+            count += 1
+
+        for column in columns:
+            files[column].write("]\n")
+
+    finally:
+        for fd in files.values():
+            fd.close()
+
+    return count
+
+def export(paths, format, output=None):
+    """
+    Export the images of 'paths' (files and directories), output is file
+    name, None for stdout, directory for columnar format. Return number
+    of images.
+    """
+
+    if format == "columnar":
+        if output == None:
+            raise ValueError("Columnar export needs output directory")
+
+        return exportColumnar(paths, output)
+
+    if format not in EXPORT_FORMATS:
+        raise ValueError("Unknown export format '%s', use one of: %s" % (format, ", ".join(EXPORT_FORMATS)))
+
+    writer = exportCsv if format == "csv" else exportJsonl
+    if output == None:
+        return writer(paths, sys.stdout)
+
+    with open(output, 'w', newline='') as fd:
+        return writer(paths, fd)
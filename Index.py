@@ -0,0 +1,198 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Persistent index of field values of a directory of FRU images
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+import EERPOM
+import CompactImage
+import hashlib
+import sqlite3
+import os
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+DEFAULT_INDEX_FILE = "fru_index.sqlite"
+IMAGE_SUFFIX = ".bin"
+
+QUERY_KEY_SEPARATOR = "."
+QUERY_VALUE_SEPARATOR = "="
+
+# Fields which are indexed besides the data fields, their values
+# are the descriptions of the fields
+INFO_FIELDS = (EERPOM.DateTimeField, EERPOM.ChassisTypeField, EERPOM.LanguageTypeField)
+
+# Images are keyed by path, field values by content hash, so equal
+# images share their values
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, hash TEXT)",
+    "CREATE TABLE IF NOT EXISTS fields (hash TEXT, area TEXT, field TEXT, value TEXT)",
+    "CREATE INDEX IF NOT EXISTS fields_value ON fields (area, field, value)",
+    "CREATE INDEX IF NOT EXISTS fields_hash ON fields (hash)",
+    "CREATE INDEX IF NOT EXISTS images_hash ON images (hash)",
+]
+
+INDEX_STATS = namedtuple("IndexStats", "added changed unchanged removed failed")
+
+#==============================================================================
+# Field values
+#==============================================================================
+def getContentHash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def getFieldValues(data):
+    """
+    Return list of (area name, field config name, value) of the image,
+    fields are decoded from the image bytes, see CompactImage.FieldView
+    """
+
+    image = CompactImage.getParseCache().getImage(data)
+    values = []
+
+    for area in image.componentsList:
+        if area.isPresent == False:
+            continue
+
+        for field in area.componentsList:
+            kind = field.getKind()
+            if issubclass(kind, EERPOM.DataField):
+                value = field.getText()
+            elif issubclass(kind, INFO_FIELDS):
+                value = field.getInfo()
+            else:
+                continue
+
+            values.append((area.name, field.getConfigName(), value))
+
+    return values
+
+#==============================================================================
+# Index
+#==============================================================================
+class ImageIndex:
+    """
+    Index of the images is kept in sqlite database. Refresh reads only
+    the files which mtime or size changed and parses only the images
+    which content was not indexed yet.
+    """
+
+    connection = None
+
+    def __init__(self, indexFile=DEFAULT_INDEX_FILE):
+        self.connection = sqlite3.connect(indexFile)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+
+    def close(self):
+        self.connection.close()
+
+    def refresh(self, directory):
+        added = changed = unchanged = removed = failed = 0
+
+        known = {}
+        prefix = os.path.join(os.path.abspath(directory), "")
+        for path, mtime, size in self.connection.execute("SELECT path, mtime, size FROM images"):
+            if path.startswith(prefix):
+                known[path] = (mtime, size)
+
+        with self.connection:
+            for path in iterImageFiles(directory):
+                stat = os.stat(path)
+                old = known.pop(path, None)
+
+                if old == (stat.st_mtime, stat.st_size):
+                    unchanged += 1
+                    continue
+
+                with open(path, 'rb') as fd:
+                    data = fd.read()
+
+                content_hash = getContentHash(data)
+                if self.isIndexed(content_hash) == False:
+                    try:
+                        values = getFieldValues(data)
+
+                    except (IndexError, ValueError):
+                        # image is kept without field values
+                        values = []
+                        failed += 1
+
+                    self.connection.executemany("INSERT INTO fields VALUES (?, ?, ?, ?)",
+                                                [(content_hash,) + value for value in values])
+
+                self.connection.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                                        (path, stat.st_mtime, stat.st_size, content_hash))
+
+                if old == None:
+                    added += 1
+                else:
+                    changed += 1
+
+            # files which are gone
+            for path in known:
+                self.connection.execute("DELETE FROM images WHERE path = ?", (path,))
+                removed += 1
+
+            self.connection.execute("DELETE FROM fields WHERE hash NOT IN (SELECT hash FROM images)")
+
+        return INDEX_STATS(added, changed, unchanged, removed, failed)
+
+    def isIndexed(self, content_hash):
+        cursor = self.connection.execute("SELECT 1 FROM images WHERE hash = ? LIMIT 1", (content_hash,))
+        return cursor.fetchone() != None
+
+    def query(self, conditions):
+        """
+        Return sorted paths of the images which match all the conditions,
+        every condition is (area name, field config name, value), value may
+        be a glob pattern
+        """
+
+        statement = "SELECT path FROM images"
+        arguments = []
+
+        for area, field, value in conditions:
+            statement += " WHERE" if len(arguments) == 0 else " AND"
+            statement += " hash IN (SELECT hash FROM fields WHERE area = ? AND field = ? AND value GLOB ?)"
+            arguments += [area, field, value]
+
+        statement += " ORDER BY path"
+        return [path for (path,) in self.connection.execute(statement, arguments)]
+
+    def getValues(self, path):
+        """
+        Return list of (area name, field config name, value) of the indexed image
+        """
+
+        statement = "SELECT area, field, value FROM fields JOIN images USING (hash) WHERE path = ?"
+        return list(self.connection.execute(statement, (os.path.abspath(path),)))
+
+def iterImageFiles(directory):
+    for root, dirs, files in os.walk(os.path.abspath(directory)):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(IMAGE_SUFFIX):
+                yield os.path.join(root, name)
+
+def parseCondition(condition):
+    """
+    "Area Name.field_name=value" -> (area name, field name, value),
+    the same keys as in the manifest, see Batch.readManifest
+    """
+
+    key, separator, value = condition.partition(QUERY_VALUE_SEPARATOR)
+    area, _, field = key.rpartition(QUERY_KEY_SEPARATOR)
+
+    if (separator == "") | (area == ""):
+        raise ValueError("Query must be 'Area Name.field_name=value': %s" % condition)
+
+    return area, field, value
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+__author__ = 'andrey samokhvalov'
+
+# Record Type IDs of the Multi Record Area, 0xC0 - 0xFF are OEM records
+infoMultiRecordTypes = [
+
+{ "Type" : b'\x00' , "Info" : "Power Supply Information"} ,
+{ "Type" : b'\x01' , "Info" : "DC Output"} ,
+{ "Type" : b'\x02' , "Info" : "DC Load"} ,
+{ "Type" : b'\x03' , "Info" : "Management Access Record"} ,
+{ "Type" : b'\x04' , "Info" : "Base Compatibility Record"} ,
+{ "Type" : b'\x05' , "Info" : "Extended Compatibility Record"} ,
+{ "Type" : b'\x06' , "Info" : "ASF Fixed SMBus Device Record"} ,
+{ "Type" : b'\x07' , "Info" : "ASF Legacy-Device Alerts"} ,
+{ "Type" : b'\x08' , "Info" : "ASF Remote Control"} ,
+{ "Type" : b'\x09' , "Info" : "Extended DC Output"} ,
+{ "Type" : b'\x0A' , "Info" : "Extended DC Load"}
+
+]
@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Layout planner: fits the EERPOM tree into EEPROM of the given size
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+import EERPOM
+import Encoding
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+FIELD_PLAN = namedtuple("FieldPlan", "area field size type_code best_size best_type_code best_data")
+AREA_PLAN = namedtuple("AreaPlan", "area offset size")
+
+#==============================================================================
+# Planner
+#==============================================================================
+class LayoutPlanner:
+    """
+    Plan of the image for EEPROM of 'capacity' bytes. Areas with unused
+    space get their minimal length. When the image still does not fit, text
+    fields are switched to their densest encoding, the field which saves
+    most goes first, until the image fits. Areas are placed one after
+    another in Common Header order, every area is aligned to MUL_OFFSET,
+    so the only padding is the one of Multi Record Area which is the last.
+    """
+
+    eerpom = None
+    capacity = None
+
+    # FIELD_PLAN of every data field of the present areas
+    fields = None
+
+    # data fields switched to their densest encoding
+    encoded = None
+
+    areas = None
+    size = None
+
+    def __init__(self, eerpom, capacity):
+        self.eerpom = eerpom
+        self.capacity = capacity
+
+    def plan(self):
+        """
+        Return True if the image fits, see getReport otherwise
+        """
+
+        self.eerpom.refresh()
+
+        self.fields = []
+        for area in self.getAreas():
+            for component in area.componentsList:
+                if isinstance(component, EERPOM.DataField):
+                    self.fields.append(self.planField(area, component))
+
+        self.encoded = []
+        self.planAreas()
+
+        savings = sorted(self.fields, key=lambda plan: plan.best_size - plan.size)
+        for plan in savings:
+            if (self.size <= self.capacity) | (plan.best_size >= plan.size):
+                break
+
+            self.encoded.append(plan)
+            self.planAreas()
+
+        return self.size <= self.capacity
+
+    def planField(self, area, field):
+        size = len(field.getData())
+        type_code = field.size.getTypeCode()
+
+        best_type_code = type_code
+        best_data = field.getData()
+
+        if type_code != Encoding.TYPE_CODE_BINARY:
+            try:
+                best_type_code, best_data = Encoding.encodeAuto(field.getText())
+
+            except ValueError:
+                pass
+
+            if len(best_data) >= size:
+                best_type_code = type_code
+                best_data = field.getData()
+
+        return FIELD_PLAN(area, field, size, type_code, len(best_data), best_type_code, best_data)
+
+    def getAreas(self):
+        return [area for area in self.eerpom.componentsList if area.isPresent]
+
+    def getAreaSize(self, area):
+        if getattr(area, "unused_field", None) == None:
+            return area.getSize()
+
+        used = area.getSize() - area.getUnusedSpaceSize()
+        for plan in self.encoded:
+            if plan.area is area:
+                used -= plan.size - plan.best_size
+
+        return EERPOM.alignSize(used, EERPOM.MUL_LENGTH)
+
+    def planAreas(self):
+        self.areas = []
+        offset = 0
+
+        for area in self.getAreas():
+            size = self.getAreaSize(area)
+            self.areas.append(AREA_PLAN(area, offset, size))
+            offset += EERPOM.alignSize(size, EERPOM.MUL_OFFSET)
+
+        self.size = 0
+        if len(self.areas) != 0:
+            self.size = self.areas[-1].offset + self.areas[-1].size
+
+    def apply(self):
+        """
+        Change the tree according to the plan
+        """
+
+        for plan in self.encoded:
+            plan.field.size.setTypeCode(plan.best_type_code)
+            plan.field.setData(plan.best_data)
+
+        for plan in self.areas:
+            if getattr(plan.area, "unused_field", None) == None:
+                continue
+
+            if plan.area.getSize() != plan.size:
+                plan.area.setSize(plan.size)
+
+        self.eerpom.refresh()
+
+    def getReport(self):
+        """
+        Sizes of all the areas and fields of the plan, with the sizes
+        of the fields in their densest encoding
+        """
+
+        lines = ["Image needs %i bytes, EEPROM size is %i bytes" % (self.size, self.capacity)]
+        if self.size > self.capacity:
+            lines[0] += " (%i bytes over)" % (self.size - self.capacity)
+
+        for area in self.areas:
+            lines.append("%-30s offset %4i size %4i" % (area.area.name, area.offset, area.size))
+
+            for plan in self.fields:
+                if (plan.area is not area.area) | (plan.size == 0):
+                    continue
+
+                encoded = plan in self.encoded
+                lines.append("    %-30s %3i bytes %-6s densest %3i bytes %-6s%s" % (
+                    plan.field.name, plan.size, Encoding.ENCODINGS[plan.type_code].name,
+                    plan.best_size, Encoding.ENCODINGS[plan.best_type_code].name,
+                    " (applied)" if encoded else ""))
+
+        return "\n".join(lines)
+
+def fitImage(eerpom, capacity):
+    """
+    Apply the plan of the tree for EEPROM of 'capacity' bytes,
+    ValueError with the report when the image does not fit
+    """
+
+    planner = LayoutPlanner(eerpom, capacity)
+    if planner.plan() == False:
+        raise ValueError(planner.getReport())
+
+    planner.apply()
+    return planner
@@ -0,0 +1,329 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# FRU service: decode, encode and verify requests over Unix socket or
+# localhost TCP, and the load generator of the service
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+import EERPOM
+import Batch
+import CompactImage
+import Verify
+import asyncio
+import concurrent.futures
+import configparser
+import base64
+import json
+import os
+import stat
+import time
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+# Every request and response is one line of json:
+# { "id" : any, "op" : "decode", "data" : base64 image }
+# { "id" : any, "op" : "verify", "data" : base64 image }
+# { "id" : any, "op" : "encode", "ini" : ini text, "fields" : { "Area Name.field_name" : value } }
+# -> { "id" : id, "ok" : true, "result" : ... } or { "id" : id, "ok" : false, "error" : text }
+
+DEFAULT_HOST = "127.0.0.1"
+
+# Most requests per task of the pool, and how long the first request
+# of a batch waits for the others
+BATCH_SIZE = 32
+BATCH_DELAY = 0.001
+
+# Requests waiting for the pool, connections are not read when it is full
+QUEUE_SIZE = 1024
+
+# Requests of one connection in flight
+CONNECTION_REQUESTS = 64
+
+# Batches in the pool per worker
+BATCHES_PER_JOB = 2
+
+LINE_LIMIT = 1 << 20
+
+LOAD_STATS = namedtuple("LoadStats", "requests errors seconds throughput p50 p99")
+
+#==============================================================================
+# Requests, handled in the workers of the pool
+#==============================================================================
+def handleRequest(request):
+    id = None
+    try:
+        id = request.get("id")
+        op = request.get("op")
+
+        if op == "decode":
+            # images seen before by the worker are not decoded again
+            data = base64.b64decode(request["data"], validate=True)
+            result = CompactImage.getParseCache().getImage(data).describe()
+
+        elif op == "verify":
+            result = Verify.verifyImage(base64.b64decode(request["data"], validate=True))
+
+        elif op == "encode":
+            config = configparser.ConfigParser()
+            config.read_string(request.get("ini", ""))
+
+            # wrong values of the ini and of the fields are errors of the request
+            eerpom = EERPOM.initFromConfig(config, strict=True)
+            Batch.applyOverrides(eerpom, request.get("fields", {}))
+            eerpom.reloadNode()
+
+            result = base64.b64encode(eerpom.getData()).decode("ascii")
+
+        else:
+            raise ValueError("Unknown operation '%s'" % op)
+
+        return { "id" : id, "ok" : True, "result" : result }
+
+    except Exception as e:
+        # any error belongs to the request alone, not to its batch
+        return { "id" : id, "ok" : False, "error" : "%s: %s" % (type(e).__name__, e) }
+
+def handleBatch(requests):
+    return [handleRequest(request) for request in requests]
+
+#==============================================================================
+# Server
+#==============================================================================
+def parseAddress(address):
+    """
+    "unix:/path/to/socket", "tcp:port" or "tcp:host:port"
+    """
+
+    kind, _, rest = address.partition(":")
+
+    if (kind == "unix") & (rest != ""):
+        return ("unix", rest)
+
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        try:
+            return ("tcp", host or DEFAULT_HOST, int(port))
+
+        except ValueError:
+            pass
+
+    raise ValueError("Address must be unix:PATH or tcp:[HOST:]PORT, not '%s'" % address)
+
+class FruServer:
+    """
+    Requests of all the connections go to one bounded queue, the batcher
+    takes them by batches to the process pool. A full queue stops reading
+    of the connections, and a connection is not read while it has
+    CONNECTION_REQUESTS requests in flight.
+    """
+
+    jobs = None
+    pool = None
+    queue = None
+    slots = None
+
+    def __init__(self, jobs=0):
+        if jobs <= 0:
+            jobs = os.cpu_count() or 1
+
+        self.jobs = jobs
+
+    async def serve(self, address):
+        kind = parseAddress(address)
+
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs,
+                                                           mp_context=Batch.getMultiprocessingContext())
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.slots = asyncio.Semaphore(self.jobs * BATCHES_PER_JOB)
+
+        if kind[0] == "unix":
+            # socket left by the server before, other files are not removed
+            if os.path.exists(kind[1]) and stat.S_ISSOCK(os.stat(kind[1]).st_mode):
+                os.unlink(kind[1])
+
+            server = await asyncio.start_unix_server(self.handleConnection, kind[1], limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self.handleConnection, kind[1], kind[2], limit=LINE_LIMIT)
+
+        batcher = asyncio.ensure_future(self.runBatcher())
+
+        try:
+            async with server:
+                await server.serve_forever()
+
+        finally:
+            batcher.cancel()
+            self.pool.shutdown()
+
+            if kind[0] == "unix":
+                os.unlink(kind[1])
+
+    async def handleConnection(self, reader, writer):
+        loop = asyncio.get_event_loop()
+        limit = asyncio.Semaphore(CONNECTION_REQUESTS)
+        lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(future):
+            response = await future
+            async with lock:
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+
+            limit.release()
+
+        try:
+            while True:
+                await limit.acquire()
+
+                line = await reader.readline()
+                if line == b"":
+                    break
+
+                future = loop.create_future()
+                try:
+                    request = json.loads(line)
+                    if isinstance(request, dict) == False:
+                        raise ValueError("Request must be json object")
+
+                    await self.queue.put((request, future))
+
+                except ValueError as e:
+                    future.set_result({ "id" : None, "ok" : False, "error" : "ValueError: %s" % e })
+
+                task = asyncio.ensure_future(respond(future))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            if pending:
+                await asyncio.wait(pending)
+
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            # line over LINE_LIMIT is ValueError of readline
+            pass
+
+        finally:
+            writer.close()
+
+    async def runBatcher(self):
+        while True:
+            batch = [await self.queue.get()]
+
+            if self.queue.empty() & (BATCH_DELAY > 0):
+                await asyncio.sleep(BATCH_DELAY)
+
+            while (len(batch) < BATCH_SIZE) & (self.queue.empty() == False):
+                batch.append(self.queue.get_nowait())
+
+            await self.slots.acquire()
+            asyncio.ensure_future(self.runBatch(batch))
+
+    async def runBatch(self, batch):
+        loop = asyncio.get_event_loop()
+        requests = [request for request, future in batch]
+
+        try:
+            responses = await loop.run_in_executor(self.pool, handleBatch, requests)
+
+        except Exception as e:
+            # broken pool, unpicklable request ...
+            responses = [{ "id" : request.get("id"), "ok" : False, "error" : str(e) } for request in requests]
+
+        finally:
+            self.slots.release()
+
+        for (request, future), response in zip(batch, responses):
+            if future.done() == False:
+                future.set_result(response)
+
+def serve(address, jobs=0):
+    asyncio.run(FruServer(jobs).serve(address))
+
+#==============================================================================
+# Load generator
+#==============================================================================
+def makeLoadImages(count):
+    """
+    Images for the load, generated from the built-in tree
+    """
+
+    config = configparser.ConfigParser()
+    config.read_dict({
+        "Common Header" : {},
+        "Chassis Info Area" : { "chassis_type" : "23", "part_number_data" : "CH-0001" },
+        "Board Info Area" : { "mfg_date_time" : "10:33 05.02.14", "manufacturer_data" : "T-Platforms",
+                              "product_name_data" : "Board", "part_number_data" : "BRD-0001" },
+        "Product Info Area" : { "manufacturer_name_data" : "T-Platforms", "product_name_data" : "Server",
+                                "part_number_data" : "SRV-0001" },
+    })
+
+    generator = Batch.PatchGenerator(EERPOM.initFromConfig(config))
+    return [generator.generate({ "Board Info Area.serial_number_data" : "SN%08i" % number,
+                                 "Product Info Area.asset_tag_data" : "AT%08i" % number })
+            for number in range(count)]
+
+async def openConnection(address):
+    kind = parseAddress(address)
+
+    if kind[0] == "unix":
+        return await asyncio.open_unix_connection(kind[1], limit=LINE_LIMIT)
+
+    return await asyncio.open_connection(kind[1], kind[2], limit=LINE_LIMIT)
+
+async def runLoad(address, images, requests=1000, concurrency=16, op="decode"):
+    """
+    Send 'requests' requests over 'concurrency' connections, every
+    connection has one request in flight. Return LOAD_STATS, latencies
+    are in milliseconds.
+    """
+
+    latencies = []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def runConnection():
+        nonlocal errors
+
+        reader, writer = await openConnection(address)
+        for number in numbers:
+            request = { "id" : number, "op" : op,
+                        "data" : base64.b64encode(images[number % len(images)]).decode("ascii") }
+
+            start = time.perf_counter()
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+
+            if response.get("ok") != True:
+                errors += 1
+
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[runConnection() for number in range(concurrency)])
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(part):
+        if len(latencies) == 0:
+            return 0.0
+
+        return 1000 * latencies[min(len(latencies) - 1, int(part * len(latencies)))]
+
+    return LOAD_STATS(len(latencies), errors, seconds, len(latencies) / seconds if seconds else 0.0,
+                      percentile(0.50), percentile(0.99))
+
+def load(address, requests=1000, concurrency=16, op="decode"):
+    images = makeLoadImages(min(requests, 1000))
+    return asyncio.run(runLoad(address, images, requests, concurrency, op))
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Zero checksum verification of FRU images without building the EERPOM tree
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from EERPOM import MUL_OFFSET, MUL_LENGTH, SUGGESTED_SIZE_COMMON_HEADER, \
+    N_CHASSIS_INFO_AREA, N_BOARD_INFO_AREA, N_PRODUCT_INFO_AREA, \
+    N_MULTI_RECORD_AREA, MULTI_RECORD_HEADER_SIZE, walkMultiRecords
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+# Areas with length and checksum, number is also the index of
+# the area offset in Common Header
+CHECKSUM_AREAS = [
+    (N_CHASSIS_INFO_AREA, "Chassis Info Area"),
+    (N_BOARD_INFO_AREA, "Board Info Area"),
+    (N_PRODUCT_INFO_AREA, "Product Info Area"),
+]
+
+#==============================================================================
+# Verification
+#==============================================================================
+def verifyImage(data):
+    """
+    Return list of errors, empty list for a correct image
+    """
+
+    errors = []
+    view = memoryview(data)
+    data_len = len(view)
+
+    if data_len < SUGGESTED_SIZE_COMMON_HEADER:
+        return ["Common Header: image is only %i bytes" % data_len]
+
+    if sum(view[:SUGGESTED_SIZE_COMMON_HEADER]) & 0xff:
+        errors.append("Common Header: wrong checksum")
+
+    for number, name in CHECKSUM_AREAS:
+        offset = MUL_OFFSET * view[number]
+        if offset == 0:
+            continue
+
+        if offset + 2 > data_len:
+            errors.append("%s: offset %i is out of image" % (name, offset))
+            continue
+
+        length = MUL_LENGTH * view[offset + 1]
+        if (length == 0) | (offset + length > data_len):
+            errors.append("%s: length %i is out of image" % (name, length))
+            continue
+
+        if sum(view[offset:offset + length]) & 0xff:
+            errors.append("%s: wrong checksum" % name)
+
+    offset = MUL_OFFSET * view[N_MULTI_RECORD_AREA]
+    if offset != 0:
+        errors += verifyMultiRecords(view, offset)
+
+    return errors
+
+def verifyMultiRecords(view, offset):
+    errors = []
+    name = "Multi Record Area"
+
+    if offset + MULTI_RECORD_HEADER_SIZE > len(view):
+        return ["%s: offset %i is out of image" % (name, offset)]
+
+    for number, (pos, type_id, length) in enumerate(walkMultiRecords(view, offset)):
+        data_pos = pos + MULTI_RECORD_HEADER_SIZE
+
+        if sum(view[pos:data_pos]) & 0xff:
+            errors.append("%s: record %i: wrong header checksum" % (name, number))
+
+        if data_pos + length > len(view):
+            errors.append("%s: record %i: length %i is out of image" % (name, number, length))
+            break
+
+        if (sum(view[data_pos:data_pos + length]) + view[pos + 3]) & 0xff:
+            errors.append("%s: record %i: wrong checksum" % (name, number))
+
+    return errors
+
+def verifyFile(binFile):
+    with open(binFile, 'rb') as fd:
+        return verifyImage(fd.read())
+
+def verifyFiles(binFiles):
+    """
+    Return list of (file, errors) pairs
+    """
+
+    results = []
+    for binFile in binFiles:
+        try:
+            results.append((binFile, verifyFile(binFile)))
+
+        except OSError as e:
+            results.append((binFile, [str(e)]))
+
+    return results
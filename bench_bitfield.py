@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Micro-benchmark: integer bit fields (BitField.py) against the former
+# bitarray implementation of extract_data/getbytes/set_data.
+# Needs bitarray for the reference implementation, see install.sh
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+from bitarray import bitarray
+from BitField import *
+import EERPOM
+import timeit
+
+NUMBER = 100000
+
+#==============================================================================
+# Reference bitarray implementation
+#==============================================================================
+def ref_getbytes(data, start, end):
+
+    array = bitarray()
+    array.frombytes(data)
+
+    length = len(array)
+    bStart = length - start - 1
+    bEnd = length - end
+
+    peace = array[bStart:bEnd]
+
+    pLen = len(peace)
+
+    byte_len = 8
+    rest = (byte_len - pLen) % byte_len
+
+    zeroArr = bitarray(rest)
+    zeroArr.setall(False)
+    zeroArr += peace
+
+    return zeroArr.tobytes()
+
+def ref_extract_data(data, start=-1, end=-1):
+    if (start == -1) & (end == -1):
+        return int.from_bytes(data, byteorder=BYTORDER)
+    else:
+        return int.from_bytes(ref_getbytes(data, start, end), byteorder=BYTORDER)
+
+def ref_set_data(o_data, n_data, start, end):
+
+        old_data = bitarray()
+        old_data.frombytes(o_data)
+        new_data = bitarray()
+        new_data.frombytes(n_data)
+
+        length = len(new_data)
+        bStart = length - start - 1
+        bEnd = length - end
+
+        first_peace = old_data[:bStart]
+        second_peace = old_data[bEnd:]
+
+        ret_data = first_peace + new_data[length - (bEnd - bStart):] + second_peace
+        return ret_data.tobytes()
+
+#==============================================================================
+# Checks and measurements
+#==============================================================================
+def check():
+    ranges = [RANGE_TYPE, RANGE_LENGTH, RANGE_FORMAT_VERSION]
+
+    for value in range(256):
+        data = bytes([value])
+        for r in ranges:
+            assert EERPOM.getbytes(data, r.begin, r.end) == ref_getbytes(data, r.begin, r.end)
+            assert EERPOM.extract_data(data, r.begin, r.end) == ref_extract_data(data, r.begin, r.end)
+
+            for new in (0x00, 0x15, 0x3f, 0xff):
+                n_data = bytes([new])
+                assert EERPOM.set_data(data, n_data, r.begin, r.end) == ref_set_data(data, n_data, r.begin, r.end)
+
+def measure(name, new, old):
+    new_time = timeit.timeit(new, number=NUMBER)
+    old_time = timeit.timeit(old, number=NUMBER)
+
+    print("%-30s %10.3f us %10.3f us %8.1fx" % (name,
+                                                 1e6 * old_time / NUMBER,
+                                                 1e6 * new_time / NUMBER,
+                                                 old_time / new_time))
+
+check()
+
+data = b'\xd5'
+print("%-30s %13s %13s %9s" % ("operation", "bitarray", "BitField", "speedup"))
+
+measure("extract_data(RANGE_LENGTH)",
+        lambda: EERPOM.extract_data(data, RANGE_LENGTH.begin, RANGE_LENGTH.end),
+        lambda: ref_extract_data(data, RANGE_LENGTH.begin, RANGE_LENGTH.end))
+
+measure("extract_data(RANGE_TYPE)",
+        lambda: EERPOM.extract_data(data, RANGE_TYPE.begin, RANGE_TYPE.end),
+        lambda: ref_extract_data(data, RANGE_TYPE.begin, RANGE_TYPE.end))
+
+measure("getBits(MASK_LENGTH)",
+        lambda: getBits(data[0], MASK_LENGTH),
+        lambda: ref_extract_data(data, RANGE_LENGTH.begin, RANGE_LENGTH.end))
+
+measure("set_data(RANGE_LENGTH)",
+        lambda: EERPOM.set_data(data, b'\x17', RANGE_LENGTH.begin, RANGE_LENGTH.end),
+        lambda: ref_set_data(data, b'\x17', RANGE_LENGTH.begin, RANGE_LENGTH.end))
+
+measure("setBits(MASK_LENGTH)",
+        lambda: bytes([setBits(data[0], MASK_LENGTH, 0x17)]),
+        lambda: ref_set_data(data, b'\x17', RANGE_LENGTH.begin, RANGE_LENGTH.end))
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+# vi: set ts=4 sw=4 ai :
+#
+# $Id$
+#
+# (C) 2014, OAO T-Platforms, Russia
+#
+# Randomized check: images of Batch.PatchGenerator against the images of
+# Batch.BatchGenerator for the same manifest rows. Wrong values must give
+# the same error, resizing values the same relaid image.
+#
+# check_patch.py [-r ROWS] [-s SEED] [template.ini ...]
+
+__author__ = 'andrey samokhvalov'
+# -*- coding: utf-8 -*-
+
+import EERPOM
+import Batch
+import argparse
+import random
+import string
+import sys
+
+#==============================================================================
+# Constants
+#==============================================================================
+
+DEFAULT_TEMPLATE = "example_ini_file.ini"
+DEFAULT_ROWS = 6000
+
+# Alphabets of the data fields: bcd, 6bit ascii, 8bit ascii and latin-1
+ALPHABETS = ["0123456789 -.",
+             string.digits + string.ascii_uppercase + " -",
+             string.ascii_letters + string.digits + string.punctuation + " ",
+             "éü"]
+
+# Characters of the wrong values, data fields are latin-1
+WRONG_CHARACTERS = "ж"
+
+# Data fields hold 63 bytes at most, longer values are errors
+MAX_DATA_LENGTH = 70
+
+#==============================================================================
+# Random rows
+#==============================================================================
+def getKeys(eerpom):
+    """
+    Manifest keys of the fields which are set by the rows: the patchable
+    fields and the type/length fields, which the patch never handles
+    """
+
+    keys = []
+    for area in eerpom.componentsList:
+        for component in area.componentsList:
+            if isinstance(component, EERPOM.Table):
+                continue
+
+            if component.patchable | isinstance(component, EERPOM.TypeField):
+                keys.append((area.name + Batch.MANIFEST_KEY_SEPARATOR + component.getConfigName(), component))
+
+    return keys
+
+def getRandomValue(field):
+    wrong = random.random() < 0.05
+
+    if isinstance(field, EERPOM.DataField):
+        alphabet = random.choice(ALPHABETS)
+        if wrong:
+            alphabet += WRONG_CHARACTERS
+
+        length = random.randint(0, MAX_DATA_LENGTH if wrong else 40)
+        return "".join(random.choice(alphabet) for number in range(length))
+
+    if isinstance(field, EERPOM.DateTimeField):
+        if wrong:
+            return random.choice(["", "25:00 01.01.14", "10:33", "text", "10:33 05.02.95", "10:33 05.02.40"])
+
+        return "%02i:%02i %02i.%02i.%02i" % (random.randint(0, 23), random.randint(0, 59),
+                                             random.randint(1, 28), random.randint(1, 12),
+                                             random.randint(96, 126) % 100)
+
+    if isinstance(field, EERPOM.TypeField):
+        return random.choice(["auto", "binary", "bcd", "6bit", "8bit"])
+
+    # chassis type and language code
+    if wrong:
+        return random.choice(["", "x", "-1", "300"])
+
+    return str(random.randint(0, 40))
+
+def getRandomRow(keys, number):
+    row = { Batch.MANIFEST_FILE_KEY : "unit%06i.bin" % number }
+
+    for key, field in random.sample(keys, random.randint(0, 4)):
+        # type/length fields are rare: they always fall back to the tree
+        if isinstance(field, EERPOM.TypeField) & (random.random() < 0.8):
+            continue
+
+        row[key] = getRandomValue(field)
+
+    return row
+
+#==============================================================================
+# Check
+#==============================================================================
+def generate(generator, row):
+    try:
+        return bytes(generator.generate(row))
+
+    except Exception as e:
+        # errors are compared too, both generators must fail alike
+        return "%s: %s" % (type(e).__name__, e)
+
+def checkTemplate(templateFile, rows, seed=0):
+    """
+    Return (rows, mismatching rows) of the template, every mismatch is
+    printed
+    """
+
+    random.seed(seed)
+
+    eerpom = Batch.loadTemplate('ini', templateFile)
+    keys = getKeys(eerpom)
+
+    batch = Batch.BatchGenerator(EERPOM.TreeTemplate(eerpom).clone())
+    patch = Batch.PatchGenerator(EERPOM.TreeTemplate(eerpom).clone())
+
+    mismatches = 0
+    for number in range(rows):
+        row = getRandomRow(keys, number)
+
+        expected = generate(batch, row)
+        result = generate(patch, row)
+
+        if result != expected:
+            mismatches += 1
+            print("%s: mismatch for %r" % (templateFile, row))
+            print("    batch: %r" % (expected,))
+            print("    patch: %r" % (result,))
+
+    return rows, mismatches
+
+#==============================================================================
+# Main
+#==============================================================================
+if __name__ == "__main__":
+    argsList = argparse.ArgumentParser(description="PatchGenerator against BatchGenerator on random rows")
+    argsList.add_argument("templates", nargs="*", default=[DEFAULT_TEMPLATE], help="ini templates")
+    argsList.add_argument("-r", "--rows", type=int, default=DEFAULT_ROWS, help="rows per template")
+    argsList.add_argument("-s", "--seed", type=int, default=0, help="seed of the rows")
+    args = argsList.parse_args()
+
+    total = 0
+    failed = 0
+    for templateFile in args.templates:
+        rows, mismatches = checkTemplate(templateFile, args.rows, args.seed)
+        total += rows
+        failed += mismatches
+
+    print("%i rows, %i mismatches" % (total, failed))
+    sys.exit(1 if failed else 0)
@@ -14,6 +14,13 @@ __author__ = 'andrey samokhvalov'
 from cmd import Cmd
 from debug import *
 import EERPOM
+import Batch
+import Verify
+import Diff
+import Export
+import Index
+import Planner
+import Server
 import argparse
 import shlex
 import sys
@@ -36,11 +43,13 @@ class Interpreter(Cmd):
 
     stop = None
     table = None
+    capacity = None
 
-    def __init__(self,eerpom):
+    def __init__(self,eerpom, capacity=None):
         Cmd.__init__(self)
 
         self.eerpom = eerpom
+        self.capacity = capacity
         self.table = eerpom
         self.stop = False
         self.prompt = STR_PROMPT
@@ -161,25 +170,29 @@ class Interpreter(Cmd):
             i += 1
 
     def do_show(self, *args):
-        'show [number]  - get description for sub-menu'
+        'show [number [page]]  - get description for sub-menu, page of hex dump of the field'
 
         args = shlex.split(args[0])
         length = len(args)
 
-        description = ""
         if length == 0:
-            description = self.table.getDescription()
-            print(description)
+            self.printDescription(self.table.iterDescription())
             return
 
-        elif length == 1:
+        elif length <= 2:
             number = None
             component = None
+            page = None
 
             try:
                 number = int(args[0])
                 component = self.table.componentsList[number]
 
+                if length == 2:
+                    page = int(args[1])
+                    if (page < 0) | (isinstance(component, EERPOM.Field) == False):
+                        raise ValueError
+
             except IndexError:
                 self.do_list()
                 return
@@ -187,8 +200,17 @@ class Interpreter(Cmd):
                 EERPOM.p_print("Incorrect value")
                 return
 
-            description = component.getDescription()
-            print(description)
+            if page == None:
+                self.printDescription(component.iterDescription())
+            else:
+                self.printDescription(component.iterDescription(page))
+
+    def printDescription(self, parts):
+        # parts are written as they are made, long dumps are not kept
+        for part in parts:
+            sys.stdout.write(part)
+
+        sys.stdout.write("\n")
 
 
     def do_save(self, *args):
@@ -204,6 +226,15 @@ class Interpreter(Cmd):
         elif length == 1:
 
             self.eerpom.reloadNode()
+
+            if self.capacity != None:
+                try:
+                    Planner.fitImage(self.eerpom, self.capacity)
+
+                except ValueError as e:
+                    e_print(str(e))
+                    return
+
             with open(args[0],"wb+") as f:
                 data = self.eerpom.getData()
                 f.write(data)
@@ -251,14 +282,128 @@ class Interpreter(Cmd):
 #==============================================================================
 
 argsList = argparse.ArgumentParser(description="FRU Information Storage image generator")
-argsList.add_argument("-t", dest="type", help="bin - for binary file ,  ini - for ini file", type=str, required=True)
-argsList.add_argument("-f", dest="file", help="path to the FRU file", type=str, required=True)
+argsList.add_argument("-t", dest="type", help="bin - for binary file ,  ini - for ini file", type=str, required=False)
+argsList.add_argument("-f", dest="file", help="path to the FRU file", type=str, required=False)
 argsList.add_argument("-c", dest="commands",help="Text file with interpreter's commands", type=str, default=None, required=False)
+argsList.add_argument("-m", dest="manifest", help="CSV/JSONL manifest with per-unit field overrides, one image per row", type=str, default=None, required=False)
+argsList.add_argument("-o", dest="output", help="Directory for images generated from manifest", type=str, default=".", required=False)
+argsList.add_argument("-j", "--jobs", dest="jobs", help="Number of processes for manifest generation, 0 - all cores", type=int, default=1, required=False)
+argsList.add_argument("--patch", dest="patch", help="Manifest images are patched copies of the template image", action="store_true", default=False, required=False)
+argsList.add_argument("--eeprom-size", dest="eeprom_size", help="EEPROM size in bytes, images are fitted to it or the sizes of their fields are reported", type=int, default=None, required=False)
+argsList.add_argument("--diff", dest="diff", help="Compare FRU binary files with the golden one (the first file) field by field and exit", type=str, nargs='+', default=None, required=False)
+argsList.add_argument("--index", dest="index", help="Index field values of the FRU binary files of the directory and exit, only changed files are read again", type=str, default=None, required=False)
+argsList.add_argument("--query", dest="query", help="Print indexed files which match all the conditions 'Area Name.field_name=value' (value may be a glob pattern) and exit", type=str, nargs='+', default=None, required=False)
+argsList.add_argument("--index-file", dest="index_file", help="Index database, default %s" % Index.DEFAULT_INDEX_FILE, type=str, default=Index.DEFAULT_INDEX_FILE, required=False)
+argsList.add_argument("--verify", dest="verify", help="Check checksums of FRU binary files and exit", type=str, nargs='+', default=None, required=False)
+argsList.add_argument("--export", dest="export", help="Export decoded fields of FRU binary files (directories are walked) and exit", type=str, nargs='+', default=None, required=False)
+argsList.add_argument("--export-format", dest="export_format", help="Format of --export: jsonl, csv or columnar (directory with json array per field)", type=str, choices=Export.EXPORT_FORMATS, default="jsonl", required=False)
+argsList.add_argument("--export-output", dest="export_output", help="Output file of --export, stdout by default, directory for columnar format", type=str, default=None, required=False)
+argsList.add_argument("--serve", dest="serve", help="Serve decode/encode/verify requests on unix:PATH or tcp:[HOST:]PORT with -j processes", type=str, default=None, required=False)
+argsList.add_argument("--load", dest="load", help="Send decode requests of generated images to the server on unix:PATH or tcp:[HOST:]PORT and print throughput and latency", type=str, default=None, required=False)
+argsList.add_argument("--load-requests", dest="load_requests", help="Number of requests of --load", type=int, default=10000, required=False)
+argsList.add_argument("--load-concurrency", dest="load_concurrency", help="Number of connections of --load", type=int, default=16, required=False)
+argsList.add_argument("--load-op", dest="load_op", help="Operation of --load: decode or verify", type=str, choices=["decode", "verify"], default="decode", required=False)
 
 
 options = argsList.parse_args()
 options = vars(options)
 
+#==============================================================================
+# Modes without EERPOM tree
+#==============================================================================
+
+if options['verify'] != None:
+    failed = 0
+    for path, errors in Verify.verifyFiles(options['verify']):
+        if len(errors) == 0:
+            print("%s: OK" % path)
+            continue
+
+        failed += 1
+        for error in errors:
+            e_print("%s: %s" % (path, error))
+
+    sys.exit(1 if failed else 0)
+
+if options['diff'] != None:
+    if len(options['diff']) < 2:
+        argsList.error("--diff needs the golden file and at least one file to compare")
+
+    different = 0
+    for path, differences, error in Diff.diffFiles(options['diff'][0], options['diff'][1:]):
+        if error != None:
+            e_print("%s: %s" % (path, error))
+            different += 1
+            continue
+
+        if len(differences) == 0:
+            print("%s: same" % path)
+            continue
+
+        different += 1
+        for difference in differences:
+            print("%s: %s" % (path, Diff.formatDifference(difference)))
+
+    sys.exit(1 if different else 0)
+
+if (options['index'] != None) | (options['query'] != None):
+    index = Index.ImageIndex(options['index_file'])
+
+    if options['index'] != None:
+        stats = index.refresh(options['index'])
+        print("added: %i changed: %i unchanged: %i removed: %i failed: %i" % stats)
+
+    if options['query'] != None:
+        try:
+            conditions = [Index.parseCondition(condition) for condition in options['query']]
+
+        except ValueError as e:
+            argsList.error(str(e))
+
+        for path in index.query(conditions):
+            print(path)
+
+    index.close()
+    sys.exit(0)
+
+if options['export'] != None:
+    try:
+        Export.export(options['export'], options['export_format'], options['export_output'])
+
+    except BrokenPipeError:
+        # output is closed by the reader, like head
+        sys.stderr.close()
+
+    except (OSError, ValueError) as e:
+        argsList.error(str(e))
+
+    sys.exit(0)
+
+if options['serve'] != None:
+    try:
+        Server.serve(options['serve'], options['jobs'])
+
+    except (ValueError, OSError) as e:
+        argsList.error(str(e))
+
+    except KeyboardInterrupt:
+        pass
+
+    sys.exit(0)
+
+if options['load'] != None:
+    try:
+        stats = Server.load(options['load'], options['load_requests'], options['load_concurrency'], options['load_op'])
+
+    except (ValueError, OSError) as e:
+        argsList.error(str(e))
+
+    print("requests: %i errors: %i seconds: %.3f throughput: %.1f req/s p50: %.2f ms p99: %.2f ms" % stats)
+    sys.exit(1 if stats.errors else 0)
+
+if (options['type'] == None) | (options['file'] == None):
+    argsList.error("the following arguments are required: -t, -f")
+
 #==============================================================================
 # Init EERPOM from file
 #==============================================================================
@@ -279,11 +424,53 @@ else:
 
 
 
+#==============================================================================
+# Fit to EEPROM size
+#==============================================================================
+
+capacity = options['eeprom_size']
+manifestFile = options['manifest']
+
+# images of the manifest are fitted one by one from the template as
+# it is, see Batch.BatchGenerator
+if (capacity != None) & (manifestFile == None):
+    planner = Planner.LayoutPlanner(eerpom, capacity)
+    if planner.plan() == False:
+        e_print(planner.getReport())
+        sys.exit(1)
+
+    planner.apply()
+
+#==============================================================================
+# Batch generation from manifest
+#==============================================================================
+
+if manifestFile != None:
+    # images are written from the rows, the interpreter is not started
+    if options['commands'] != None:
+        sys.exit("-c can't be used together with -m")
+
+    rows = Batch.readManifest(manifestFile)
+    jobs = options['jobs']
+
+    if jobs == 1:
+        results = Batch.generateImages(eerpom, rows, options['output'], capacity, options['patch'])
+    else:
+        results = Batch.generateImagesParallel(type, dataFile, rows, options['output'], jobs, capacity, options['patch'])
+
+    errors = 0
+    for path, error in results:
+        if error != None:
+            e_print("%s: %s" % (path, error))
+            errors += 1
+
+    sys.exit(1 if errors else 0)
+
 #==============================================================================
 # Start cmd loop
 #==============================================================================
 
-interpreter = Interpreter(eerpom)
+interpreter = Interpreter(eerpom, capacity)
 commandsFile = options['commands']
 
 if commandsFile != None:
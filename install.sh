@@ -1,2 +1,3 @@
 sudo apt-get install python3-pip
+# bitarray is needed only for the reference implementation in bench_bitfield.py
 sudo pip3 install "./bitarray-0.8.1.tar.gz"